@@ -1,12 +1,22 @@
 import ast
 import inspect
+import json
 import logging
+import math
+import time
 from collections import defaultdict
 
+from core import translation as t
 from core.exercises import assert_equal
 from core.question_wizard import question_wizard_check
+from core.runner import timings
+from core.runner.budget import execution_budget, ExecutionBudgetExceeded, user_code
+from core.runner.explanations import explain_exception
 from core.runner.runner import EnhancedRunner
-from core.text import pages
+from core.runner.source_cache import forget_source
+from core.runner.utils import counting_highlight_cache
+from core.submission import Submission
+from core.text import pages, Step
 from core.utils import highlighted_markdown, catch_internal_errors
 
 log = logging.getLogger(__name__)
@@ -34,11 +44,9 @@ class FullRunner(EnhancedRunner):
     def reset(self):
         super().reset()
         if self.question_wizard:
-            # Delay importing stack_data in general.
             # Clear the source cache before running in the question wizard
             # for the input() magic to work properly.
-            import stack_data
-            stack_data.Source._class_local("__source_cache", {}).pop(self.filename, None)
+            forget_source(self.filename)
 
         self.console.locals.update(assert_equal=assert_equal)
 
@@ -46,32 +54,132 @@ class FullRunner(EnhancedRunner):
 default_runner = FullRunner(filename="/my_program.py")
 
 
+class OutputCollector:
+    """
+    Collects the output parts of a run for check_entry and passes them on to the callback.
+
+    Output parts are passed on in batches, at most once per `flush_interval` seconds,
+    and whatever is pending is passed on before any other event (e.g. input) by calling `flush()`.
+    Output from stdout and stderr beyond `max_length` characters is dropped
+    and replaced by a message saying so, both in the callback and in `text()`.
+    """
+
+    max_length = 100_000
+    flush_interval = 0.1
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.chunks = []
+        self.pending = []
+        self.length = 0
+        self.total_length = 0
+        self.num_parts = 0
+        self.truncated = False
+        self.last_flush = time.monotonic()
+
+    def add_parts(self, parts):
+        for part in parts:
+            self.num_parts += 1
+            typ = part["type"]
+            if typ == "input":
+                continue
+
+            text = part["text"]
+            if typ in ("stdout", "stderr"):
+                self.total_length += len(text)
+                if self.truncated:
+                    continue
+                remaining = self.max_length - self.length
+                if len(text) > remaining:
+                    self.add_part(dict(part, text=text[:remaining]))
+                    self.truncated = True
+                    part = dict(
+                        type="stderr",
+                        text="\n" + t.Terms.output_truncated.format(max_length=self.max_length) + "\n",
+                    )
+            self.add_part(part)
+
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def add_part(self, part):
+        self.chunks.append(part["text"])
+        self.length += len(part["text"])
+        self.pending.append(part)
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if self.pending:
+            parts = self.pending
+            self.pending = []
+            self.callback("output", dict(parts=parts))
+
+    def text(self):
+        return "".join(self.chunks)
+
+    def stats(self):
+        return dict(
+            parts=self.num_parts,
+            length=self.total_length,
+            truncated=self.truncated,
+        )
+
+
 @catch_internal_errors
 def check_entry(entry, callback, runner=default_runner):
+    if hasattr(entry, "to_py"):
+        entry = entry.to_py()
+
+    with (
+        timings.recording(timings.enabled or entry.get("timings")) as recorded,
+        counting_highlight_cache(),
+        user_code(runner.filename),
+    ):
+        result = _check_entry(entry, callback, runner)
+    if recorded:
+        result["timings"] = recorded.as_dict()
+    return result
+
+
+def _check_entry(entry, callback, runner):
     result = dict(
         passed=False,
         error=None,
         message_sections=[],
     )
     try:
-        if hasattr(entry, "to_py"):
-            entry = entry.to_py()
-
         if not entry["input"].strip():
             return result
 
-        result["output"] = ""
+        output = OutputCollector(callback)
+
+        # Output as ExerciseStep.check_exercise would see it when running the code itself,
+        # see Submission.run_output
+        run_output = []
+        run_inputs = []
+        last_type = None
 
         def wrapped_callback(event_type, data):
+            nonlocal run_output, last_type
             if event_type == "output":
-                parts = []
                 for part in data["parts"]:
                     typ = part["type"]
-                    if typ == "input":
-                        continue
-                    result["output"] += part["text"]
-                    parts.append(part)
-                data["parts"] = parts
+                    if run_output is not None:
+                        if typ == "input" and last_type == "input_prompt" and part["text"].count("\n") == 1:
+                            value = part["text"][:-1]
+                            run_inputs.append(value)
+                            run_output.append(f"<input: {value}>\n")
+                        elif typ in ("stdout", "input_prompt"):
+                            run_output.append(part["text"])
+                        elif typ != "stderr":
+                            run_output = None
+                        last_type = typ
+                output.add_parts(data["parts"])
+                if output.truncated:
+                    run_output = None
+                return
+
+            output.flush()
             return callback(event_type, data)
 
         runner.set_callback(wrapped_callback)
@@ -82,29 +190,51 @@ def check_entry(entry, callback, runner=default_runner):
         if mode == "shell":
             mode = "single"
 
+        if runner.question_wizard:
+            step_cls = None
+        else:
+            with timings.span("load_step"):
+                page = pages[entry["page_slug"]]
+                step_cls = page.get_step(entry["step_name"])
+
+        runner.submission = submission = Submission(entry["input"], runner.filename)
         runner.birdseye_objects = None
         try:
-            runner.run(entry["input"], mode)
+            budget = getattr(step_cls, "execution_budget", Step.execution_budget) if submission.may_run_long else None
+            with execution_budget(budget), timings.span("run"):
+                runner.run(entry["input"], mode)
+        except ExecutionBudgetExceeded:
+            runner.post_run()
+            result["message_sections"] = [
+                dict(type="messages", messages=[highlighted_markdown(t.Terms.code_took_too_long)])
+            ]
+            return result
         finally:
             result["birdseye_objects"] = runner.birdseye_objects
+            output.flush()
+            result["output"] = output.text()
+            result["output_stats"] = output.stats()
+            timings.count("output_characters", result["output_stats"]["length"])
+
+        if entry["source"] == "editor" and run_output is not None:
+            submission.run_output = run_inputs, "".join(run_output)
 
         if runner.question_wizard:
-            (
-                result["messages"],
-                result["question_wizard_status"],
-            ) = question_wizard_check(entry, result["output"], runner)
+            with timings.span("question_wizard"):
+                (
+                    result["messages"],
+                    result["question_wizard_status"],
+                ) = question_wizard_check(entry, result["output"], runner)
             return result
 
-        page = pages[entry["page_slug"]]
-        step_cls = page.get_step(entry["step_name"])
-
         step_result = dict(passed=False, messages=[])
         if entry["step_name"] != "final_text":
             step_instance = step_cls(
-                entry["input"], result["output"], entry["source"], runner.console
+                entry["input"], result["output"], entry["source"], runner.console, submission
             )
             try:
-                step_result = step_instance.check_with_messages()
+                with timings.span("check"):
+                    step_result = step_instance.check_with_messages()
             except SyntaxError:
                 pass
 
@@ -113,14 +243,56 @@ def check_entry(entry, callback, runner=default_runner):
             if "message" in step_result:
                 step_result["messages"].insert(0, step_result.pop("message"))
 
-            result["message_sections"] = [
-                dict(
-                    type=typ,
-                    messages=[highlighted_markdown(message) for message in step_result.get(typ, [])],
-                )
-                for typ in ["messages", "passed_tests", "lint"]
-            ]
+            with timings.span("markdown"):
+                result["message_sections"] = [
+                    dict(
+                        type=typ,
+                        messages=[highlighted_markdown(message) for message in step_result.get(typ, [])],
+                    )
+                    for typ in ["messages", "passed_tests", "lint"]
+                ]
     except KeyboardInterrupt:
         result["interrupted"] = True
 
     return result
+
+
+# Increase this when the structure of the result of check_entry changes
+# in a way that the frontend needs to know about, and update Worker.js to match.
+result_schema_version = 1
+
+
+def check_entry_json(entry, callback, runner=default_runner):
+    """
+    Returns the result of check_entry as a JSON string, with the schema version:
+
+        {"schema_version": result_schema_version, "result": {...}}
+
+    Transferring one string to JavaScript and parsing it there is much cheaper
+    than converting the nested result with `toJs`.
+    JSON.parse rejects NaN and Infinity, so such floats are written as strings.
+    """
+    result = dict(schema_version=result_schema_version, result=check_entry(entry, callback, runner))
+    try:
+        return json.dumps(result, allow_nan=False)
+    except ValueError:
+        return json.dumps(_finite_floats(result), allow_nan=False)
+
+
+def _finite_floats(value):
+    # A copy of a JSON-like value with NaN and infinite floats replaced by strings like 'inf'
+    if isinstance(value, float) and not math.isfinite(value):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: _finite_floats(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite_floats(item) for item in value]
+    return value
+
+
+def explain_traceback(handle):
+    """
+    Returns the friendly_traceback and didyoumean explanations for a traceback
+    in the `data` of a traceback output part, given its `explanation` handle.
+    """
+    return explain_exception(handle)
@@ -2,11 +2,14 @@ import ast
 import random
 import string
 import typing
+from contextlib import contextmanager
 from textwrap import indent
 
 from littleutils import only
 
 from core import translation as t
+from core.runner.budget import ExecutionBudgetExceeded
+from core.submission import Submission
 from core.utils import format_exception_string, returns_stdout
 
 
@@ -18,8 +21,10 @@ class InvalidInitialCode(Exception):
     pass
 
 
-def make_function(program, arg_names):
-    tree = ast.parse(program)
+def make_function(submission, arg_names):
+    if isinstance(submission, str):
+        submission = Submission(submission)
+    tree = submission.tree
     try:
         assert len(tree.body) >= len(arg_names)
         for node, arg_name in zip(tree.body, arg_names):
@@ -33,10 +38,7 @@ def make_function(program, arg_names):
             t.Terms.code_should_start_like.format(expected_start=expected_start)
         )
 
-    assignments = tree.body[:len(arg_names)]
-    exercise = tree.body[len(arg_names):]
-    tree.body = assignments
-    code = compile(tree, "<string>", "exec", dont_inherit=True)
+    code = submission.compile_statements(0, len(arg_names))
     initial_names = {}
     try:
         exec(code, initial_names)
@@ -44,8 +46,7 @@ def make_function(program, arg_names):
         raise InvalidInitialCode from e
     del initial_names["__builtins__"]
 
-    tree.body = exercise
-    code = compile(tree, "<string>", "exec", dont_inherit=True)
+    code = submission.compile_statements(len(arg_names))
 
     def func(**kwargs):
         exec(code, kwargs)
@@ -80,6 +81,8 @@ def inputs_string(inputs):
 def check_result(func, inputs, expected_result):
     try:
         result = func(**inputs)
+    except ExecutionBudgetExceeded:
+        result = t.Terms.code_took_too_long
     except Exception:
         result = format_exception_string()
 
@@ -105,6 +108,46 @@ def check_result(func, inputs, expected_result):
     return dict(passed=passed, message=message), result
 
 
+class SeededRandom:
+    """
+    Gives code that uses the functions of the global `random` module
+    (e.g. the `generate_inputs` methods of steps) its own separate random state,
+    so that its results only depend on the seed.
+    """
+
+    def __init__(self, seed):
+        self.state = random.Random(seed).getstate()
+
+    @contextmanager
+    def activate(self):
+        outer_state = random.getstate()
+        random.setstate(self.state)
+        try:
+            yield
+        finally:
+            self.state = random.getstate()
+            random.setstate(outer_state)
+
+
+def serialize_test_value(test_value):
+    """
+    Returns a compact string form of an (inputs, result) pair
+    that `deserialize_test_value` turns back into an equal pair,
+    or None if that isn't possible.
+    """
+    result = repr(test_value)
+    try:
+        if repr(deserialize_test_value(result)) == result:
+            return result
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        pass
+    return None
+
+
+def deserialize_test_value(string):
+    return ast.literal_eval(string)
+
+
 def generate_string(length=None):
     if length is None:
         length = random.randrange(5, 11)
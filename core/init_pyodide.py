@@ -1,9 +1,91 @@
+import importlib
+import sys
+import tarfile
+from io import BytesIO
+from pathlib import Path
+
+from littleutils import file_to_json
+
 from core import translation as t
-from core.text import load_chapters
+from core.text import load_chapters, pages, page_modules_path, step_records, step_records_path
+
+# Lists the modules in each of the bundles written by scripts/generate_static_files.py
+bundles_path = Path(__file__).parent / "bundles.json"
+
+
+def fetch_bytes(url):
+    # Imports can't wait for a promise, but synchronous requests are allowed in web workers.
+    from js import XMLHttpRequest
+
+    request = XMLHttpRequest.new()
+    request.open("GET", url, False)
+    request.responseType = "arraybuffer"
+    request.send()
+    if request.status != 200:
+        raise OSError(f"Status {request.status} fetching {url}")
+    return request.response.to_bytes()
+
 
+class BundleFinder:
+    """
+    Meta path finder which fetches a bundle of packages and extracts it into `directory`
+    the first time one of its modules is imported, after which the usual finders import the module.
+    That way packages only needed for some features (e.g. tracebacks or birdseye)
+    aren't loaded before the first run along with python_core.tar.
+    """
 
-def init(lang):
+    def __init__(self, bundle_urls, manifest, directory):
+        self.bundle_urls = bundle_urls
+        self.module_bundles = {
+            module: bundle
+            for bundle, modules in manifest.items()
+            for module in modules
+        }
+        self.directory = directory
+
+    def find_spec(self, fullname, path=None, target=None):
+        bundle = self.module_bundles.get(fullname)
+        if bundle is None:
+            return None
+
+        try:
+            content = fetch_bytes(self.bundle_urls[bundle])
+        except Exception as e:
+            # Leave the bundle in module_bundles so that importing it again tries again.
+            raise ImportError(f"Failed to load the {bundle} bundle for {fullname}", name=fullname) from e
+
+        with tarfile.open(fileobj=BytesIO(content)) as tar:
+            tar.extractall(self.directory, filter="data")
+        self.module_bundles = {
+            module: other
+            for module, other in self.module_bundles.items()
+            if other != bundle
+        }
+        importlib.invalidate_caches()
+        return None
+
+
+def init(lang, bundle_urls=None):
     if lang and lang != "en":
         t.set_language(lang)
 
-    list(load_chapters())
+    # These files are written into python_core.tar by scripts/generate_static_files.py
+    try:
+        step_records.update(file_to_json(step_records_path))
+    except FileNotFoundError:
+        pass
+
+    try:
+        pages.modules = file_to_json(page_modules_path)
+    except FileNotFoundError:
+        list(load_chapters())
+
+    if bundle_urls is not None:
+        if hasattr(bundle_urls, "to_py"):
+            bundle_urls = bundle_urls.to_py()
+        try:
+            manifest = file_to_json(bundles_path)
+        except FileNotFoundError:
+            # Everything is in python_core.tar
+            manifest = {}
+        sys.meta_path.insert(0, BundleFinder(bundle_urls, manifest, Path(__file__).parent.parent))
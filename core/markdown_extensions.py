@@ -5,14 +5,12 @@ from textwrap import dedent
 from markdown.extensions import Extension
 from markdown.treeprocessors import Treeprocessor
 from pygments.formatters import HtmlFormatter
-from pygments.lexers import get_lexer_by_name
 from pygments.styles import get_style_by_name
 
 from core.utils import check_and_remove_prefix
-from core.runner.utils import is_valid_syntax
+from core.runner.utils import is_valid_syntax, highlight_python
 from core import translation as t
 
-lexer = get_lexer_by_name("python3")
 monokai = get_style_by_name("monokai")
 html_formatter = HtmlFormatter(nowrap=True)
 
@@ -51,9 +49,7 @@ class HighlightPythonTreeProcessor(Treeprocessor):
     @staticmethod
     def highlight_node(node, text):
         import xml.etree.ElementTree as etree
-        import pygments
-
-        highlighted = pygments.highlight(text, lexer, html_formatter)
+        highlighted = highlight_python(text, html_formatter)
         tail = node.tail
         node.clear()
         node.set("class", "codehilite")
@@ -62,9 +58,9 @@ class HighlightPythonTreeProcessor(Treeprocessor):
 
 
 class HighlightPythonExtension(Extension):
-    codes = None
+    processor = None
 
     def extendMarkdown(self, md):
-        processor = HighlightPythonTreeProcessor()
-        processor.codes = self.codes
-        md.treeprocessors.register(processor, "highlight_python", 0)
+        # Set processor.codes to a new list before each conversion
+        self.processor = HighlightPythonTreeProcessor()
+        md.treeprocessors.register(self.processor, "highlight_python", 0)
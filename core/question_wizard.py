@@ -1,4 +1,3 @@
-import ast
 from textwrap import indent, dedent
 from core import translation as t
 
@@ -59,7 +58,7 @@ def question_wizard_check(entry, output, runner):
         messages.append(t.Terms.q_wiz_no_output)
 
     try:
-        tree = ast.parse(entry["input"])
+        tree = runner.submission.tree
     except SyntaxError:
         pass
     else:
@@ -0,0 +1,106 @@
+"""
+Limits how much work the user's code can do in a single run or test,
+so that infinite loops and runaway recursion end with a message
+instead of freezing the worker until the user presses stop.
+
+The budget counts function calls and jumps (i.e. loop iterations) in the user's code
+with sys.monitoring (Python 3.12+). Events in other code are disabled the first time they're seen,
+but the callback still runs for every call and loop iteration in the user's code,
+which makes a tight loop about 3.5-4x slower (2 million iterations of `x += i` on Python 3.12).
+So the budget is only used for code with loops or functions (see Submission.may_run_long),
+since other code can't keep running by itself.
+Over the entries of tests/benchmark_steps.py that adds a median of 0.1ms to a check,
+and at most about 13ms, for exercises with many tests of nested loops.
+Without sys.monitoring there's no limit.
+"""
+
+import sys
+from contextlib import contextmanager
+from functools import cache
+
+# Only code compiled from this file counts towards the budget, see `user_code`.
+_user_filename = None
+_remaining = None
+
+
+class ExecutionBudgetExceeded(BaseException):
+    """
+    Raised inside the user's code when it has used up its budget.
+    This isn't an Exception so that `except Exception:` in the user's code doesn't catch it.
+    """
+
+
+def _count_event(code, *_args):
+    global _remaining
+    if code.co_filename != _user_filename:
+        return sys.monitoring.DISABLE
+    _remaining -= 1
+    if _remaining < 0:
+        raise ExecutionBudgetExceeded
+
+
+@cache
+def _tool_id():
+    try:
+        monitoring = sys.monitoring
+    except AttributeError:
+        return None
+
+    # IDs 3 and 4 aren't assigned to any kind of tool,
+    # so this doesn't stop profilers, debuggers or coverage from working.
+    for tool_id in [3, 4]:
+        try:
+            monitoring.use_tool_id(tool_id, "futurecoder")
+            break
+        except ValueError:
+            pass
+    else:
+        return None
+
+    for event in [monitoring.events.PY_START, monitoring.events.JUMP]:
+        monitoring.register_callback(tool_id, event, _count_event)
+    return tool_id
+
+
+@contextmanager
+def user_code(filename):
+    """
+    Makes code compiled from `filename` count towards budgets within the `with` block,
+    i.e. the submission being checked.
+    Code from other files, including earlier submissions, doesn't count.
+    """
+    global _user_filename
+    previous = _user_filename
+    _user_filename = filename
+    if _tool_id() is not None:
+        # Events disabled while another file was the user's may be in this one.
+        sys.monitoring.restart_events()
+    try:
+        yield
+    finally:
+        _user_filename = previous
+
+
+@contextmanager
+def execution_budget(budget):
+    """
+    Raises ExecutionBudgetExceeded in the user's code if it makes more than `budget`
+    function calls and jumps within the `with` block.
+    Does nothing if `budget` is None.
+    """
+    global _remaining
+    tool_id = _tool_id() if budget else None
+    if tool_id is None:
+        yield
+        return
+
+    events = sys.monitoring.events
+    previous = _remaining
+    _remaining = budget
+    sys.monitoring.set_events(tool_id, events.PY_START | events.JUMP)
+    try:
+        yield
+    finally:
+        _remaining = previous
+        if previous is None:
+            sys.monitoring.set_events(tool_id, 0)
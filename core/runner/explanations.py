@@ -0,0 +1,51 @@
+"""
+The friendly_traceback and didyoumean explanations of an exception
+are much slower to compute than the traceback itself,
+and often aren't looked at, so tracebacks only include a handle for them.
+The frontend asks for the explanations with the handle (via core.checker.explain_traceback)
+after the result of the run has been shown.
+
+A worker can be restarted between the run and the request (e.g. after an interrupt),
+so handles start with an ID unique to this process, and handles from another process
+are rejected instead of being mistaken for a different exception with the same number.
+"""
+
+import uuid
+from collections import OrderedDict
+from itertools import count
+
+# Exceptions whose explanations may still be requested, by handle.
+# Each one keeps its frames alive, so only the most recent ones are kept.
+pending_exceptions = OrderedDict()
+max_pending_exceptions = 20
+
+_process_id = uuid.uuid4().hex
+_handle_numbers = count(1)
+
+
+def defer_explanation(e: BaseException) -> str:
+    handle = f"{_process_id}-{next(_handle_numbers)}"
+    pending_exceptions[handle] = e
+    while len(pending_exceptions) > max_pending_exceptions:
+        pending_exceptions.popitem(last=False)
+    return handle
+
+
+def explain_exception(handle: str) -> dict:
+    """
+    Returns dict(didyoumean=[...], friendly="...") for the exception
+    passed to defer_explanation, or empty explanations if it's been forgotten
+    or was deferred in another process.
+    """
+    process_id, _, _ = str(handle).partition("-")
+    e = pending_exceptions.pop(handle, None) if process_id == _process_id else None
+    if e is None:
+        return dict(didyoumean=[], friendly="")
+
+    from core.runner.didyoumean import didyoumean_suggestions
+    from core.runner.friendly_traceback import friendly_message
+
+    return dict(
+        didyoumean=didyoumean_suggestions(e),
+        friendly=friendly_message(e, double_newline=True),
+    )
@@ -1,11 +1,64 @@
+import ast
 import traceback
 
-from python_runner import PyodideRunner
+from python_runner import PyodideRunner, Runner
 
 import core.translation as t
+from core.runner import timings
+from core.runner.budget import ExecutionBudgetExceeded
+from core.runner.source_cache import register_source
 
 
-class EnhancedRunner(PyodideRunner):
+class SubmissionRunner(Runner):
+    """
+    Compiles the code being run from the shared Submission (see core.submission)
+    when there is one, so that the code isn't parsed again by the checker.
+    """
+
+    submission = None
+
+    def pre_run(self, source_code, mode="exec", top_level_await=False):
+        submission = self.submission
+        if not (
+            submission
+            and submission.source == source_code
+            and submission.filename == self.filename
+        ):
+            return super().pre_run(source_code, mode, top_level_await)
+
+        # The same as Runner.pre_run, which has no separate compile step to override,
+        # except that the code object comes from the submission.
+        compile_mode = mode
+        if mode == "single":
+            source_code += "\n"  # Allow compiling single-line compound statements
+        elif mode != "eval":
+            compile_mode = "exec"
+            self.reset()
+        self.output_buffer.reset()
+
+        self.set_source_code(source_code)
+
+        try:
+            return submission.compile(
+                compile_mode,
+                flags=top_level_await * ast.PyCF_ALLOW_TOP_LEVEL_AWAIT,
+            )
+        except SyntaxError as e:
+            try:
+                if not submission.tree.body:
+                    # Code is only comments, which cannot be compiled in 'single' mode
+                    return
+            except SyntaxError:
+                pass
+
+            self.output("syntax_error", **self.serialize_syntax_error(e))
+
+
+class EnhancedRunner(PyodideRunner, SubmissionRunner):
+    def set_source_code(self, source_code):
+        super().set_source_code(source_code)
+        register_source(self.filename)
+
     def execute(self, code_obj, mode=None, snoop_config=None):
         if mode == "birdseye":
             from core.runner.birdseye import exec_birdseye
@@ -17,17 +70,13 @@ class EnhancedRunner(PyodideRunner):
             super().execute(code_obj, mode=mode, snoop_config={"color": True})
 
     def serialize_traceback(self, exc):
-        if isinstance(exc, KeyboardInterrupt):
+        if isinstance(exc, (KeyboardInterrupt, ExecutionBudgetExceeded)):
             raise
 
-        from .stack_data import format_traceback_stack_data, serializer
+        from .stack_data import serialize_traceback
 
-        serializer.filename = self.filename
-
-        return {
-            "text": format_traceback_stack_data(exc),
-            "data": serializer.format_exception(exc),
-        }
+        with timings.span("traceback"):
+            return serialize_traceback(exc, self.filename)
 
     def serialize_syntax_error(self, e):
         from core.runner.friendly_traceback import friendly_message
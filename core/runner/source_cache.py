@@ -0,0 +1,149 @@
+"""
+A registry of the source code run by the user, keyed by a hash of its content,
+which keeps the caches that would otherwise grow with every run bounded:
+
+- `linecache`, which the runner fills for each filename it runs.
+- The files themselves, which the runner also writes (to MEMFS in Pyodide).
+- The per-class caches of `Source` objects and executing nodes
+  in `executing` and `stack_data`, used for tracebacks and FullRunner.input.
+  Those libraries never clear them.
+
+Worker.js gives each run a new filename, so without this
+every version of the user's code would stay in memory for the whole session.
+Only the most recently run `max_sources` distinct sources are kept.
+
+Running the same code again under a new filename reuses the Source objects
+already parsed for it, instead of parsing it again.
+"""
+
+import copy
+import hashlib
+import linecache
+import os
+import sys
+from collections import OrderedDict
+
+max_sources = 20
+# Rerunning the same code repeatedly still gives it a new filename each time
+max_filenames_per_source = 5
+
+
+class _Entry:
+    def __init__(self, lines):
+        self.lines = lines
+        # Filenames whose code currently in linecache is these lines, oldest first.
+        # This is a dict to keep the order.
+        self.filenames = {}
+
+
+# Hash of the source -> _Entry, least recently run first
+_entries = OrderedDict()
+
+# Filename -> hash of the source last registered for it
+_filename_keys = {}
+
+
+def register_source(filename):
+    """
+    Records that the source code currently in linecache for `filename` is about to run,
+    and evicts the cached data of sources that haven't been run for a while.
+    """
+    try:
+        lines = tuple(linecache.cache[filename][2])
+    except KeyError:
+        return
+
+    key = hashlib.sha256("".join(lines).encode("utf8", "surrogatepass")).hexdigest()
+    old_key = _filename_keys.get(filename)
+    if old_key != key and old_key in _entries:
+        # e.g. a shell command run after the program.
+        # Code objects from the old source may still be running, so keep their executing nodes.
+        _forget_sources(_entries[old_key], filename)
+    _filename_keys[filename] = key
+
+    entry = _entries.get(key)
+    if entry is None:
+        entry = _entries[key] = _Entry(lines)
+    else:
+        _entries.move_to_end(key)
+        _reuse_sources(entry, filename)
+    entry.filenames.pop(filename, None)
+    entry.filenames[filename] = None
+
+    evicted = False
+    while len(entry.filenames) > max_filenames_per_source:
+        _evict(entry, next(iter(entry.filenames)))
+        evicted = True
+
+    while len(_entries) > max_sources:
+        _, old_entry = _entries.popitem(last=False)
+        for old_filename in list(old_entry.filenames):
+            _evict(old_entry, old_filename)
+        evicted = True
+
+    executing = sys.modules.get("executing.executing")
+    if evicted and executing:
+        # These are caches shared by all Source objects, so they can't be cleared selectively
+        executing.Source.statements_at_line.cache_clear()
+        executing.statement_containing_node.cache_clear()
+
+
+def forget_source(filename):
+    """
+    Removes the Source objects and executing nodes cached for `filename`,
+    so that they're created again the next time they're needed.
+    """
+    key = _filename_keys.pop(filename, None)
+    if key in _entries:
+        _forget_sources(_entries[key], filename)
+    _forget_executing(filename)
+
+
+def _source_classes():
+    # Avoid importing executing and stack_data just for this
+    for module_name in ["executing", "stack_data"]:
+        module = sys.modules.get(module_name)
+        if module:
+            yield module.Source
+
+
+def _evict(entry, filename):
+    del _filename_keys[filename]
+    linecache.cache.pop(filename, None)
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
+    _forget_sources(entry, filename)
+    _forget_executing(filename)
+
+
+def _forget_sources(entry, filename):
+    entry.filenames.pop(filename, None)
+    for cls in _source_classes():
+        cls._class_local("__source_cache_with_lines", {}).pop((filename, entry.lines), None)
+
+
+def _forget_executing(filename):
+    for cls in _source_classes():
+        executing_cache = cls._class_local("__executing_cache", {})
+        for code_key in [k for k in executing_cache if k[0].co_filename == filename]:
+            del executing_cache[code_key]
+
+
+def _reuse_sources(entry, filename):
+    """
+    Copies Source objects already parsed for the same lines under another filename.
+    Only the filename differs; the tree and everything else computed from the text is shared.
+    """
+    for cls in _source_classes():
+        source_cache = cls._class_local("__source_cache_with_lines", {})
+        if (filename, entry.lines) in source_cache:
+            continue
+        for other_filename in entry.filenames:
+            source = source_cache.get((other_filename, entry.lines))
+            if source is not None:
+                source = copy.copy(source)
+                source.filename = filename
+                source_cache[(filename, entry.lines)] = source
+                break
@@ -1,23 +1,30 @@
+import itertools
 import logging
+import time
+import traceback
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from textwrap import dedent
 from typing import Union, Iterable
 
-import pygments
 from cheap_repr import cheap_repr
-from pygments.lexers import get_lexer_by_name
 from stack_data import (
     Formatter,
     FrameInfo,
+    Line,
     RepeatedFrames,
     Serializer,
     Options,
 )
 
-from core.runner.didyoumean import didyoumean_suggestions
-from core.runner.friendly_traceback import friendly_message
-from core.runner.utils import is_valid_syntax
+from core.runner.explanations import defer_explanation
+from core.runner.utils import is_valid_syntax, highlight_python
 
 log = logging.getLogger(__name__)
-lexer = get_lexer_by_name("python3")
+
+# The same as traceback.print_exception
+_cause_message = "\nThe above exception was the direct cause of the following exception:\n\n"
+_context_message = "\nDuring handling of the above exception, another exception occurred:\n\n"
 
 
 class TracebackSerializer(Serializer):
@@ -26,8 +33,7 @@ class TracebackSerializer(Serializer):
     def format_traceback_part(self, e: BaseException) -> dict:
         return dict(
             **super().format_traceback_part(e),
-            didyoumean=didyoumean_suggestions(e),
-            friendly=friendly_message(e, double_newline=True),
+            explanation=defer_explanation(e),
         )
 
     def format_variable_value(self, value) -> str:
@@ -38,7 +44,7 @@ class TracebackSerializer(Serializer):
 
     def format_variable_part(self, text):
         if is_valid_syntax(text):
-            return pygments.highlight(text, lexer, self.options.pygments_formatter)
+            return highlight_python(text, self.options.pygments_formatter)
         else:
             return super().format_variable_part(text)
 
@@ -79,3 +85,309 @@ formatter = TracebackFormatter(
 
 def format_traceback_stack_data(e):
     return "".join(formatter.format_exception(e))
+
+
+@dataclass
+class TracebackBudget:
+    """
+    Limits on how much of an exception chain `serialize_traceback` formats,
+    so that huge tracebacks (e.g. deep mutual recursion) are still quick to show.
+    """
+
+    # Frames (after collapsing repeated frames) per exception.
+    # Frames in the middle beyond this are left out and only counted.
+    max_frames: int = 40
+    # Variables shown per frame
+    max_variables: int = 50
+    # Once the text reaches this many characters, further variables are left out
+    max_length: int = 100_000
+
+
+def serialize_traceback(e, filename, budget=None):
+    """
+    Returns dict(text=..., data=...) equivalent to
+    `format_traceback_stack_data(e)` and `serializer.format_exception(e)`
+    (with `serializer.filename = filename`), but only analysing each frame once:
+    the same FrameInfo objects, variables and reprs are used for both.
+    """
+    start_time = time.perf_counter()
+    budget = budget or TracebackBudget()
+    serializer.filename = filename
+
+    chain = [e]
+    while True:
+        if e.__cause__ is not None:
+            e = e.__cause__
+        elif e.__context__ is not None and not e.__suppress_context__:
+            e = e.__context__
+        else:
+            break
+        chain.append(e)
+
+    if not all(e.__traceback__ for e in chain):
+        # The separate formatters have different fallbacks for a missing traceback
+        return dict(
+            text=format_traceback_stack_data(chain[0]),
+            data=serializer.format_exception(chain[0]),
+        )
+
+    state = _SerializationState(budget)
+    for e in reversed(chain):
+        state.add_exception(e)
+
+    log.debug(
+        "Serialized traceback with %s frames in %.3fs",
+        state.num_frames,
+        time.perf_counter() - start_time,
+    )
+    return dict(text="".join(state.text), data=state.data)
+
+
+class _SerializationState:
+    def __init__(self, budget):
+        self.budget = budget
+        self.text = []
+        self.length = 0
+        self.data = []
+        self.num_frames = 0
+
+    def add_text(self, text):
+        self.text.append(text)
+        self.length += len(text)
+
+    def add_exception(self, e):
+        if self.data:
+            if e.__cause__ is not None:
+                message = _cause_message
+            else:
+                message = _context_message
+            self.add_text(message)
+            self.data[-1]["tail"] = message.strip()
+
+        self.add_text("Traceback (most recent call last):\n")
+        frames = []
+        for item in self.stack(e.__traceback__):
+            if isinstance(item, FrameInfo):
+                self.num_frames += 1
+                frames.extend(self.add_frame(item))
+            elif isinstance(item, RepeatedFrames):
+                self.add_text(formatter.format_repeated_frames(item) + "\n")
+                frames.append(dict(type="repeated_frames", **serializer.format_repeated_frames(item)))
+            else:
+                self.add_text(f"    [... {item.count} frames omitted ...]\n\n")
+                frames.append(dict(type="omitted_frames", count=item.count))
+
+        for text in traceback.format_exception_only(type(e), e):
+            self.add_text(text)
+
+        self.data.append(dict(
+            frames=frames,
+            exception=dict(
+                type=type(e).__name__,
+                message=_some_str(e),
+            ),
+            tail="",
+            explanation=defer_explanation(e),
+        ))
+
+    def stack(self, tb):
+        """
+        Like FrameInfo.stack_data, but shown frames beyond budget.max_frames are replaced by
+        an _OmittedFrames before creating any FrameInfo objects,
+        which are only created for frames that are shown.
+        """
+        tbs = []
+        while tb:
+            tbs.append(tb)
+            tb = tb.tb_next
+
+        items = list(_collapse_repeated(tbs))
+        shown = [
+            i
+            for i, item in enumerate(items)
+            if isinstance(item, RepeatedFrames) or _is_shown(item)
+        ]
+        max_frames = self.budget.max_frames
+        if len(shown) > max_frames:
+            head = max_frames // 2
+            tail = len(shown) - (max_frames - head)
+            start = shown[head]
+            end = shown[tail]
+            count = sum(
+                len(items[i].frames) if isinstance(items[i], RepeatedFrames) else 1
+                for i in shown[head:tail]
+            )
+            items = [*items[:start], _OmittedFrames(count), *items[end:]]
+
+        for item in items:
+            if isinstance(item, (RepeatedFrames, _OmittedFrames)):
+                yield item
+            else:
+                yield FrameInfo(item, combined_options)
+
+    def add_frame(self, frame_info):
+        """
+        Adds the text for one frame and yields its data, if the frame belongs in each.
+        """
+        from core.runner.snoop import snoop
+
+        in_text = not frame_info.filename.startswith(snoop.tracer.internal_directories)
+        in_data = serializer.should_include_frame(frame_info)
+        if not (in_text or in_data):
+            return
+
+        if in_text:
+            self.add_text(formatter.format_frame_header(frame_info))
+            for line in frame_info.lines:
+                if isinstance(line, Line):
+                    self.add_text(formatter.format_line(line))
+                else:
+                    self.add_text(formatter.line_gap_string + "\n")
+
+        if in_data:
+            # The data only shows the executing piece, i.e. Options(before=0),
+            # where the indentation to strip only depends on those lines.
+            lines = []
+            executing_lines = [
+                line
+                for line in frame_info.lines
+                if isinstance(line, Line) and line.lineno in frame_info.executing_piece
+            ]
+            if executing_lines:
+                dedented = dedent("\n".join(line.text for line in executing_lines)).splitlines()
+                leading_indent = len(executing_lines[0].text) - len(dedented[0])
+                for line in executing_lines:
+                    # Stripped the same way as Line.render does with strip_leading_indent
+                    text = line.render(
+                        pygmented=serializer.pygmented,
+                        escape_html=serializer.html,
+                        strip_leading_indent=False,
+                    ).replace(line.text[:leading_indent], "", 1)
+                    lines.append(dict(
+                        type="line",
+                        is_current=line.is_current,
+                        lineno=line.lineno,
+                        text=text,
+                    ))
+
+            result = dict(
+                type="frame",
+                name=frame_info.executing.code_qualname(),
+                filename=frame_info.filename,
+                lineno=frame_info.lineno,
+                lines=lines,
+                variables=[],
+            )
+
+        for name, value in self.variables(frame_info):
+            if in_text and value is not None:
+                self.add_text(f"{name} = {value}\n")
+            if in_data:
+                if value is None:
+                    # This is where Serializer.format_variables would stop
+                    in_data = False
+                    yield result
+                    continue
+                result["variables"].append(dict(
+                    name=serializer.format_variable_part(name),
+                    value=serializer.format_variable_part(value),
+                ))
+
+        if in_text:
+            self.add_text("\n")
+        if in_data:
+            yield result
+
+    def variables(self, frame_info):
+        """
+        Yields pairs (name, value repr) of the frame's variables within the budget,
+        or (name, None) if the repr failed.
+        """
+        try:
+            variables = sorted(frame_info.variables, key=lambda v: v.name)
+        except Exception:
+            log.exception("Error in getting frame variables")
+            return
+
+        for var in variables[:self.budget.max_variables]:
+            if self.length >= self.budget.max_length:
+                return
+            try:
+                value = cheap_repr(var.value)
+            except Exception:
+                value = None
+            yield var.name, value
+
+
+@dataclass
+class _OmittedFrames:
+    # Frames left out because of TracebackBudget.max_frames
+    count: int
+
+
+def _is_shown(tb):
+    # Whether _SerializationState.add_frame adds anything for this frame
+    from core.runner.snoop import snoop
+
+    filename = tb.tb_frame.f_code.co_filename
+    return filename == serializer.filename or not filename.startswith(snoop.tracer.internal_directories)
+
+
+def _frame_key(tb):
+    # The key by which FrameInfo.stack_data decides which frames are repeated
+    return tb.tb_frame.f_code, tb.tb_lineno
+
+
+def _collapse_repeated(tbs):
+    """
+    Yields the tracebacks in tbs, with similar frames collapsed into RepeatedFrames
+    the same way as FrameInfo.stack_data.
+    """
+    keys = [_frame_key(tb) for tb in tbs]
+    for is_shown, group in itertools.groupby(
+        zip(tbs, keys, _shown_frames(keys)),
+        key=lambda item: item[2],
+    ):
+        group_tbs, group_keys, _ = zip(*group)
+        if is_shown:
+            yield from group_tbs
+        else:
+            yield RepeatedFrames(list(group_tbs), list(group_keys))
+
+
+def _shown_frames(keys):
+    """
+    Yields a bool for each key saying whether that frame is shown.
+    Within a run of keys that each occur more than 3 times,
+    only the first two and last frames with each key are shown.
+    """
+    counts = Counter(keys)
+    for is_common, group in itertools.groupby(keys, key=lambda key: counts[key] > 3):
+        group = list(group)
+        if not is_common:
+            yield from [True] * len(group)
+            continue
+
+        positions = defaultdict(list)
+        for i, key in enumerate(group):
+            positions[key].append(i)
+        shown = [False] * len(group)
+        for indices in positions.values():
+            for i in indices[:2] + indices[-1:]:
+                shown[i] = True
+        yield from shown
+
+
+def _some_str(value):
+    # The exception message as in Serializer.format_traceback_part
+    try:
+        return str(value)
+    except Exception:
+        return f"<unprintable {type(value).__name__} object>"
+
+
+combined_options = Options(
+    before=formatter.options.before,
+    after=formatter.options.after,
+    pygments_formatter=serializer.options.pygments_formatter,
+)
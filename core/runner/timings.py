@@ -0,0 +1,121 @@
+"""
+Records how long the stages of checking a submission take,
+e.g. running the code, serializing tracebacks, running tests, linting and rendering messages,
+along with counters such as the number of tests run.
+
+Nothing is recorded unless a `recording()` block is active:
+`span()` then returns a shared object whose `with` block does nothing,
+and `count()` returns immediately.
+
+check_entry records when `enabled` is true or the entry has `"timings": true`,
+puts the result in the `timings` field of its result, and passes it to each sink in `sinks`.
+"""
+
+import time
+from bisect import bisect_right
+from contextlib import contextmanager
+
+enabled = False
+
+# Callables which are passed the timings of each recording as a dict
+# like `Timings.as_dict()`, e.g. a HistogramSink.
+sinks = []
+
+_current = None
+
+
+class Timings:
+    def __init__(self):
+        # Name -> total seconds
+        self.spans = {}
+        self.counters = {}
+
+    def as_dict(self):
+        return dict(
+            spans={name: round(seconds, 6) for name, seconds in self.spans.items()},
+            counters=dict(self.counters),
+        )
+
+
+class _Span:
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *_):
+        spans = self.timings.spans
+        spans[self.name] = spans.get(self.name, 0) + time.perf_counter() - self.start
+
+
+class _NullSpan:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *_):
+        pass
+
+
+_null_span = _NullSpan()
+
+
+def span(name):
+    """
+    Returns a context manager which adds the time spent in its block to the span `name`.
+    Spans with the same name add up, and spans may be nested.
+    """
+    if _current is None:
+        return _null_span
+    return _Span(_current, name)
+
+
+def count(name, amount=1):
+    if _current is not None:
+        _current.counters[name] = _current.counters.get(name, 0) + amount
+
+
+@contextmanager
+def recording(active=True):
+    """
+    Records spans and counters within the block into the yielded Timings,
+    which is passed to the sinks at the end.
+    Yields None and records nothing if `active` is false.
+    """
+    global _current
+    if not active:
+        yield None
+        return
+
+    previous = _current
+    timings = _current = Timings()
+    try:
+        yield timings
+    finally:
+        _current = previous
+        result = timings.as_dict()
+        for sink in sinks:
+            sink(result)
+
+
+class HistogramSink:
+    """
+    Aggregates the spans of many recordings into histograms
+    with buckets that double in size, starting from `smallest` seconds,
+    and adds up the counters.
+    """
+
+    def __init__(self, smallest=0.001, num_buckets=16):
+        self.bucket_limits = [smallest * 2 ** i for i in range(num_buckets - 1)]
+        self.histograms = {}
+        self.counters = {}
+        self.recordings = 0
+
+    def __call__(self, timings):
+        self.recordings += 1
+        for name, seconds in timings["spans"].items():
+            histogram = self.histograms.setdefault(name, [0] * (len(self.bucket_limits) + 1))
+            histogram[bisect_right(self.bucket_limits, seconds)] += 1
+        for name, amount in timings["counters"].items():
+            self.counters[name] = self.counters.get(name, 0) + amount
@@ -1,17 +1,61 @@
 import ast
+import functools
+import keyword
 import os
+from contextlib import contextmanager
 
 import executing
-from littleutils import strip_required_suffix
 
-site_packages = strip_required_suffix(
-    executing.__file__, f"executing{os.path.sep}__init__.py"
-)
+from core.runner import timings
 
+# executing may have been imported from __init__.pyc, see FUTURECODER_DROP_SOURCES in generate_static_files
+site_packages = os.path.dirname(os.path.dirname(executing.__file__)) + os.path.sep
 
+
+@functools.lru_cache(maxsize=4096)
 def is_valid_syntax(text):
+    # Quick answers for common cases, e.g. variable names and reprs in tracebacks
+    if text.isidentifier() and not keyword.iskeyword(text):
+        return True
+    if text.lstrip()[:1] in ("<", ")", "]", "}"):
+        return False
+
     try:
         ast.parse(text)
         return True
     except Exception:
         return False
+
+
+@functools.cache
+def python_lexer():
+    from pygments.lexers import get_lexer_by_name
+
+    return get_lexer_by_name("python3")
+
+
+@functools.lru_cache(maxsize=4096)
+def highlight_python(text, formatter):
+    """
+    `pygments.highlight` for Python code, cached because the same snippets
+    (variable names in tracebacks, code in messages) are highlighted again and again.
+    The formatter is part of the key by identity, so pass a shared instance.
+    """
+    import pygments
+
+    return pygments.highlight(text, python_lexer(), formatter)
+
+
+@contextmanager
+def counting_highlight_cache():
+    """
+    Adds the hits and misses of the highlight_python cache within the block
+    to the timings counters `highlight_cache_hits` and `highlight_cache_misses`.
+    """
+    before = highlight_python.cache_info()
+    try:
+        yield
+    finally:
+        after = highlight_python.cache_info()
+        timings.count("highlight_cache_hits", after.hits - before.hits)
+        timings.count("highlight_cache_misses", after.misses - before.misses)
@@ -0,0 +1,136 @@
+import ast
+
+from core.runner import timings
+
+_long_running_nodes = (
+    ast.For,
+    ast.AsyncFor,
+    ast.While,
+    ast.comprehension,
+    ast.FunctionDef,
+    ast.AsyncFunctionDef,
+    ast.Lambda,
+)
+
+
+class Submission:
+    """
+    Code entered by the user in a single check_entry call.
+
+    Parsing and compiling is done at most once for each way the code is needed,
+    and the results are shared by the runner, the step checks, and the linter.
+    Trees returned by this class must not be mutated.
+    """
+
+    def __init__(self, source, filename="<unknown>"):
+        self.source = source
+        self.filename = filename
+        # (input values, stdout) of running the submission as a program in the editor,
+        # if it finished without errors.
+        # The stdout shows input values like `add_stdin_input_arg` does.
+        self.run_output = None
+        self._trees = {}
+        self._codes = {}
+        self._evaluations = {}
+        self._may_run_long = None
+
+    @property
+    def tree(self):
+        return self.parse("exec")
+
+    def parse(self, mode):
+        try:
+            result = self._trees[mode]
+        except KeyError:
+            source = self.source
+            if mode == "single":
+                source += "\n"  # Allow compiling single-line compound statements
+            try:
+                result = ast.parse(source, self.filename, mode)
+            except SyntaxError as e:
+                # Python takes the text of the line from the file called self.filename if it exists,
+                # which still has the previous submission if the runner hasn't written this one yet.
+                lines = source.splitlines(keepends=True)
+                if e.lineno and 0 < e.lineno <= len(lines):
+                    e.text = lines[e.lineno - 1]
+                result = e
+            self._trees[mode] = result
+
+        if isinstance(result, SyntaxError):
+            raise result
+        return result
+
+    @property
+    def may_run_long(self):
+        """
+        Whether the code has loops or functions (which may recurse),
+        without which it can't keep running by itself, so it doesn't need an execution budget.
+        """
+        if self._may_run_long is None:
+            try:
+                tree = self.tree
+            except SyntaxError:
+                self._may_run_long = False
+            else:
+                self._may_run_long = any(isinstance(node, _long_running_nodes) for node in ast.walk(tree))
+        return self._may_run_long
+
+    def compile(self, mode, flags=0):
+        """
+        Compiles the whole submission with its own filename, e.g. for the runner.
+        """
+        key = (mode, flags)
+        if key not in self._codes:
+            self._codes[key] = compile(self.parse(mode), self.filename, mode, flags=flags)
+        return self._codes[key]
+
+    def compile_statements(self, start, end=None):
+        """
+        Compiles a slice of the top level statements, independently of any calling code.
+        """
+        key = (start, end)
+        if key not in self._codes:
+            module = ast.Module(body=self.tree.body[start:end], type_ignores=[])
+            self._codes[key] = compile(module, self.filename, "exec", dont_inherit=True)
+        return self._codes[key]
+
+    def memoize(self, func, key):
+        """
+        Returns a function that calls `func(**inputs)` only once for each distinct `inputs`
+        (see `_inputs_key`) among all functions memoized with the same `key` for this submission,
+        returning the same result or raising the same exception on later calls.
+        This lets message steps reuse the results of running the user's code
+        on the same tests as the main step.
+        """
+        evaluations = self._evaluations.setdefault(key, {})
+
+        def memoized(**inputs):
+            inputs_key = _inputs_key(inputs)
+            try:
+                raised, result = evaluations[inputs_key]
+            except KeyError:
+                timings.count("tests_run")
+                try:
+                    raised, result = False, func(**inputs)
+                except Exception as e:
+                    raised, result = True, e
+                evaluations[inputs_key] = raised, result
+
+            if raised:
+                raise result
+            return result
+
+        return memoized
+
+    def add_evaluation(self, key, inputs, result):
+        """
+        Records the result of calling a function memoized with `key` on `inputs`
+        which is already known without calling it.
+        """
+        self._evaluations.setdefault(key, {})[_inputs_key(inputs)] = False, result
+
+
+def _inputs_key(inputs):
+    # Compared by repr so that e.g. 1 and True are different inputs,
+    # but not in order, since the same inputs can come from different places.
+    return repr(sorted(inputs.items()))
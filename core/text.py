@@ -3,10 +3,12 @@ from __future__ import annotations
 import ast
 import inspect
 import itertools
+import operator
 import re
+import zlib
 from abc import ABC, abstractmethod
 from copy import deepcopy
-from functools import cached_property, cache
+from functools import cached_property, cache, partial
 from importlib import import_module
 from io import StringIO
 from pathlib import Path
@@ -16,12 +18,14 @@ from tokenize import Untokenizer, generate_tokens
 from types import MethodType
 from typing import Union, List, get_type_hints
 
-import pygments
-from astcheck import is_ast_like
+from astcheck import is_ast_like, ASTMismatch
 from littleutils import setattrs, only, select_attrs
 
 from core import translation as t
 from core.exercises import (
+    SeededRandom,
+    serialize_test_value,
+    deserialize_test_value,
     check_result,
     generate_for_type,
     inputs_string,
@@ -33,10 +37,12 @@ from core.exercises import (
     indented_inputs_string,
 )
 from core.linting import lint
-from core.runner.utils import is_valid_syntax
+from core.runner import timings
+from core.runner.budget import execution_budget
+from core.runner.utils import is_valid_syntax, highlight_python
+from core.submission import Submission
 from core.utils import (
     highlighted_markdown,
-    lexer,
     html_formatter,
     shuffled_well,
     clean_spaces,
@@ -62,8 +68,35 @@ def clean_program(program, cls):
         cls.show_solution_program = program = t.translate_program(cls, program)
         return program
 
-    func = program
     source = t.translate_program(cls, inspect.getsource(program))
+    if program.__name__ == "solution":
+        cls.solution_source = source
+    source, tree = load_solution(cls, program, source)
+    func_node = function_node(cls.solution, tree)
+
+    if cls.is_function_exercise:
+        program = source
+        cls.show_solution_program = ast.get_source_segment(source, func_node)
+    else:
+        lines = source.splitlines()[func_node.body[0].lineno - 1 :]
+        cls.show_solution_program = program = clean_spaces(lines)
+        if hasattr(cls, "test_values"):
+            inputs = cls.example_inputs()
+            cls.stdin_input = inputs.pop("stdin_input", [])
+            if inputs:
+                inputs = inputs_string(inputs)
+                program = inputs + "\n" + program
+
+    compile(program, "<program>", "exec")  # check validity
+    return program
+
+
+def load_solution(cls, func, source):
+    """
+    Executes `source`, the translated source code of the method `func`,
+    and sets `cls.solution` to the resulting function, wrapped for testing.
+    Returns the source of the actual solution code and its parsed tree.
+    """
     globs = func.__globals__  # noqa
     exec(source, globs)
     func = globs[t.get_code_bit(func.__name__)]
@@ -76,7 +109,7 @@ def clean_program(program, cls):
         assert lines[0] == f"def {t.get_code_bit('solution')}(self):"
         assert lines[-1] == f"    return {func.__name__}"
         source = clean_spaces(lines[1:-1])
-        source = program = clean_solution_function(func, source)
+        source = clean_solution_function(func, source)
 
     tree = ast.parse(source)
     if not any(
@@ -86,22 +119,7 @@ def clean_program(program, cls):
     func = add_stdin_input_arg(func)
     func = NoMethodWrapper(func)
     cls.solution = func
-    func_node = function_node(func, tree)
-
-    if cls.is_function_exercise:
-        cls.show_solution_program = ast.get_source_segment(source, func_node)
-    else:
-        lines = lines[func_node.body[0].lineno - 1 :]
-        cls.show_solution_program = program = clean_spaces(lines)
-        if hasattr(cls, "test_values"):
-            inputs = cls.example_inputs()
-            cls.stdin_input = inputs.pop("stdin_input", [])
-            if inputs:
-                inputs = inputs_string(inputs)
-                program = inputs + "\n" + program
-
-    compile(program, "<program>", "exec")  # check validity
-    return program
+    return source, tree
 
 
 def basic_signature(func):
@@ -127,8 +145,75 @@ def get_special_messages(cls):
 
 @cache
 def clean_step_class(cls):
+    """
+    Prepares a step class for checking submissions.
+
+    If `step_records` contains a record for the step (generated at build time by `get_step_records`)
+    then the translated text, program, and solution are loaded from it directly.
+    Otherwise everything is computed from the class and then verified,
+    i.e. the solution is tested and the data needed only for the frontend (e.g. `get_solution`) is generated.
+    """
     assert cls.__name__ != "step_name_here"
 
+    record = step_records.get(cls.text_msgid)
+    if record:
+        text, program = load_step_record(cls, record)
+    else:
+        text, program = translate_step_class(cls)
+
+    messages = []
+    for name, inner_cls in inspect.getmembers(cls):
+        if not (isinstance(inner_cls, type) and issubclass(inner_cls, Step)):
+            continue
+        assert issubclass(inner_cls, MessageStep)
+
+        inner_cls.tests = inner_cls.tests or cls.tests
+        inner_cls.generate_inputs = getattr(cls, "generate_inputs", None)
+        inner_cls.page = cls.page
+        inner_cls.text_msgid = t.message_step_text(cls, inner_cls)
+        clean_step_class(inner_cls)
+
+        original_inner_cls = inner_cls
+
+        # noinspection PyAbstractClass
+        class inner_cls(inner_cls, cls):
+            __qualname__ = inner_cls.__qualname__
+            __module__ = inner_cls.__module__
+
+        inner_cls.__name__ = original_inner_cls.__name__
+
+        messages.append(inner_cls)
+
+    setattrs(cls,
+             text=text,
+             program=program,
+             messages=messages)
+
+    if isinstance(cls.disallowed, Disallowed):
+        cls.disallowed = [cls.disallowed]
+    for i, disallowed in enumerate(cls.disallowed):
+        if record:
+            disallowed.text = record["disallowed"][i]
+        else:
+            disallowed.setup(cls, i)
+
+    cls.disallowed_matchers = {
+        function_only: TemplateMatcher({
+            disallowed: (disallowed.template, disallowed.predicate)
+            for disallowed in cls.disallowed
+            if disallowed.function_only == function_only
+        })
+        for function_only in [False, True]
+    }
+
+    if cls.expected_code_source:
+        cls.expected_code_source_term()
+
+    if not record:
+        verify_step_class(cls)
+
+
+def translate_step_class(cls):
     text = cls.text or cls.__doc__
     program = cls.program
     hints = cls.hints
@@ -145,8 +230,6 @@ def clean_step_class(cls):
         cls.solution = MethodType(solution, "")
         program = clean_program(cls.solution, cls)  # noqa
         cls.solution = cls.wrap_solution(cls.solution)
-        if not issubclass(cls, MessageStep) or cls.after_success:
-            cls.test_exercise(cls.solution)
     else:
         program = clean_program(program, cls)
 
@@ -154,7 +237,7 @@ def clean_step_class(cls):
 
     if isinstance(hints, str):
         hints = hints.strip().splitlines()
-    hints = [t.get(t.hint(cls, i), hint.strip()) for i, hint in enumerate(hints)]
+    cls.hints = [t.get(t.hint(cls, i), hint.strip()) for i, hint in enumerate(hints)]
 
     text = clean_spaces(text)
     assert text
@@ -189,47 +272,70 @@ def clean_step_class(cls):
         except SyntaxError:
             pass
 
-    messages = []
-    for name, inner_cls in inspect.getmembers(cls):
-        if not (isinstance(inner_cls, type) and issubclass(inner_cls, Step)):
-            continue
-        assert issubclass(inner_cls, MessageStep)
+    return text, program
 
-        inner_cls.tests = inner_cls.tests or cls.tests
-        inner_cls.generate_inputs = getattr(cls, "generate_inputs", None)
-        inner_cls.page = cls.page
-        inner_cls.text_msgid = t.message_step_text(cls, inner_cls)
-        clean_step_class(inner_cls)
 
-        original_inner_cls = inner_cls
+def verify_step_class(cls):
+    if "solution_source" in cls.__dict__ and (not issubclass(cls, MessageStep) or cls.after_success):
+        cls.test_exercise(cls.solution)
 
-        # noinspection PyAbstractClass
-        class inner_cls(inner_cls, cls):
-            __qualname__ = inner_cls.__qualname__
-            __module__ = inner_cls.__module__
+    for message_cls in cls.messages:
+        if message_cls.after_success and issubclass(message_cls, ExerciseStep):
+            cls.check_exercise(message_cls.solution)
 
-        inner_cls.__name__ = original_inner_cls.__name__
+    cls.get_solution = get_solution(cls)
 
-        messages.append(inner_cls)
 
-        if inner_cls.after_success and issubclass(inner_cls, ExerciseStep):
-            cls.check_exercise(inner_cls.solution)
+step_records = {}
+step_records_path = Path(__file__).parent / "step_records.json"
 
-    setattrs(cls,
-             text=text,
-             program=program,
-             messages=messages,
-             hints=hints)
 
-    cls.get_solution = get_solution(cls)
+def step_record(cls):
+    """
+    The data that `clean_step_class` computes for the current language
+    and needs again at runtime, in a JSON-serializable form.
+    """
+    record = dict(
+        text=cls.text,
+        program=cls.program,
+        stdin_input=cls.stdin_input,
+        disallowed=[disallowed.text for disallowed in cls.disallowed],
+        special_messages=[
+            [special_message.text, special_message.program]
+            for special_message in get_special_messages(cls)
+        ],
+    )
+    if "solution_source" in cls.__dict__:
+        record["solution"] = cls.solution_source
+    if issubclass(cls, ExerciseStep):
+        record["test_values"] = cls.serialize_test_values()
+    return record
 
-    if isinstance(cls.disallowed, Disallowed):
-        cls.disallowed = [cls.disallowed]
-    for i, disallowed in enumerate(cls.disallowed):
-        disallowed.setup(cls, i)
 
-    if cls.expected_code_source:
-        cls.expected_code_source_term()
+def load_step_record(cls, record):
+    if "solution" in record:
+        load_solution(cls, cls.__dict__["solution"], record["solution"])
+        cls.solution = cls.wrap_solution(cls.solution)
+
+    cls.stdin_input = record["stdin_input"]
+    if issubclass(cls, ExerciseStep):
+        cls.serialized_test_values = record["test_values"]
+    for special_message, (text, program) in zip(get_special_messages(cls), record["special_messages"]):
+        special_message.text = text
+        special_message.program = program
+
+    return record["text"], record["program"]
+
+
+def get_step_records(page_slugs=None):
+    result = {}
+    for page, step_name in iter_step_names(final_text=False):
+        if page_slugs is not None and page.slug not in page_slugs:
+            continue
+        step = page.get_step(step_name)
+        for cls in [step, *[message_cls.__bases__[0] for message_cls in step.messages]]:
+            result[cls.text_msgid] = step_record(cls)
+    return result
 
 
 def get_predictions(cls):
@@ -275,22 +381,25 @@ def get_solution(step):
         if not token.isspace():
             masked_indices.append(i)
             mask[i] = True
-    shuffle(masked_indices)
 
-    if step.parsons_solution:
-        lines = shuffled_well([
-            dict(
-                id=str(i),
-                content=line,
-            )
-            for i, line in enumerate(
-                pygments.highlight(program, lexer, html_formatter)
-                    .splitlines()
-            )
-            if line.strip()
-        ])
-    else:
-        lines = None
+    # Shuffle the same way for a given step, regardless of which steps were cleaned before
+    with SeededRandom(zlib.crc32(step.text_msgid.encode())).activate():
+        shuffle(masked_indices)
+
+        if step.parsons_solution:
+            lines = shuffled_well([
+                dict(
+                    id=str(i),
+                    content=line,
+                )
+                for i, line in enumerate(
+                    highlight_python(program, html_formatter)
+                        .splitlines()
+                )
+                if line.strip()
+            ])
+        else:
+            lines = None
 
     return dict(
         tokens=tokens,
@@ -300,8 +409,26 @@ def get_solution(step):
     )
 
 
-pages = {}
+class LazyPages(dict):
+    """
+    Maps page slugs to Page classes.
+    When `modules` (a mapping from page slug to chapter module name, see `page_modules`)
+    is set, a missing page is loaded by importing only the chapter module that defines it,
+    so that the worker doesn't have to import every chapter on startup.
+    """
+
+    modules = {}
+
+    def __missing__(self, slug):
+        if slug not in self.modules:
+            raise KeyError(slug)
+        import_module(self.modules[slug])
+        return dict.__getitem__(self, slug)
+
+
+pages = LazyPages()
 page_slugs_list = []
+page_modules_path = Path(__file__).parent / "page_modules.json"
 
 
 class PageMeta(type):
@@ -400,7 +527,7 @@ class Page(metaclass=PageMeta):
 
 
 class Disallowed:
-    def __init__(self, template, *, label="", message="", max_count=0, predicate=lambda n: True, function_only=False):
+    def __init__(self, template, *, label="", message="", max_count=0, predicate=None, function_only=False):
         assert bool(label) ^ bool(message)
         self.label = label
         self.message = clean_spaces(message)
@@ -446,6 +573,11 @@ class Step(ABC):
     is_function_exercise = False
     requirements = ""
 
+    # Maximum number of function calls and loop iterations in the user's code
+    # for running the code and for each exercise test, or None for no limit.
+    # Only applies to code with loops or functions, see Submission.may_run_long.
+    execution_budget = 10_000_000
+
     class special_messages:
         pass
 
@@ -453,9 +585,13 @@ class Step(ABC):
     def pre_run(cls, runner):
         pass
 
-    def __init__(self, *args):
-        self.args = args
-        self.input, self.result, self.code_source, self.console = args
+    def __init__(self, input, result, code_source, console, submission=None):
+        self.input = input
+        self.result = result
+        self.code_source = code_source
+        self.console = console
+        self.submission = submission or Submission(input)
+        self.args = (input, result, code_source, console, self.submission)
 
     def clean_check(self) -> Union[bool, dict]:
         result = self.check()
@@ -477,12 +613,12 @@ class Step(ABC):
                 return result | dict(message=message_cls.text, passed=False)
 
         if result["passed"]:
+            counts = {}
             for d in self.disallowed:
-                if search_ast(
-                    self.function_tree if d.function_only else self.tree,
-                    d.template,
-                    d.predicate
-                ) > d.max_count:
+                if d.function_only not in counts:
+                    tree = self.function_tree if d.function_only else self.tree
+                    counts[d.function_only] = self.disallowed_matchers[d.function_only].counts(tree)
+                if counts[d.function_only][d] > d.max_count:
                     return result | dict(message=d.text, passed=False)
 
             if self.expected_code_source not in (None, self.code_source):
@@ -499,7 +635,8 @@ class Step(ABC):
             except SyntaxError:
                 pass
             else:
-                result["lint"] = lint(tree)
+                with timings.span("lint"):
+                    result["lint"] = list(lint(tree))
 
         return result
 
@@ -532,9 +669,9 @@ class Step(ABC):
     def get_requirements(cls):
         return []
 
-    @cached_property
+    @property
     def tree(self):
-        return ast.parse(self.input)
+        return self.submission.tree
 
     def input_matches(self, pattern, remove_spaces=True):
         inp = self.input.rstrip()
@@ -562,12 +699,15 @@ def function_node(func, tree):
 
 
 class ExerciseStep(Step):
+    num_random_tests = 10
+    serialized_test_values = None
+
     def check(self):
         if self.code_source == "shell":
             return False
 
         if not self.is_function_exercise:
-            return self.check_exercise(self.input, functionise=True)
+            return self.check_exercise(self.submission, functionise=True, memo=self.submission)
         else:
             function_name = self.solution.__name__
             if function_name not in self.console.locals:
@@ -588,7 +728,7 @@ class ExerciseStep(Step):
             if actual_signature != needed_signature:
                 return dict(message=t.Terms.signature_should_be.format(**locals()))
 
-            return self.check_exercise(func)
+            return self.check_exercise(func, memo=self.submission)
 
     @classmethod
     def get_requirements(cls):
@@ -628,9 +768,14 @@ class ExerciseStep(Step):
         return func
 
     @classmethod
-    def check_exercise(cls, submission, functionise=False):
+    def check_exercise(cls, submission, functionise=False, memo=None):
         solution = cls.solution
-        test_values = list(cls.test_values())
+        test_values = cls.test_values()
+        memo_key = (
+            tuple(cls.arg_names()) if functionise else submission,
+            cls.wrap_solution.__func__,
+            getattr(solution, "returns_stdout", False),
+        )
 
         if functionise:
             try:
@@ -651,18 +796,30 @@ class ExerciseStep(Step):
             except Exception:
                 return dict(message=t.Terms.invalid_inputs)
 
-            if not any(names == initial_names for names, _ in test_values):
+            if memo:
+                cls._reuse_run_output(memo, memo_key, initial_names)
+
+            fixed_test_values = list(itertools.islice(test_values, len(cls.tests)))
+            if not any(names == initial_names for names, _ in fixed_test_values):
                 # Show a test in the assessment for the user's own initial values,
                 # if there isn't a test for them already.
-                test_values.insert(0, (initial_names, expected_result))
+                fixed_test_values.insert(0, (initial_names, expected_result))
+            test_values = itertools.chain(fixed_test_values, test_values)
         else:
             submission = cls.wrap_solution(submission)
             func = cls._patch_streams(submission)
 
+        if memo:
+            func = memo.memoize(func, memo_key)
+
+        # Solutions checked without a submission (e.g. in verify_step_class) don't need a budget
+        budget = cls.execution_budget if memo and memo.may_run_long else None
         passed_tests = []
         return_value = dict(passed_tests=passed_tests, passed=True)
         for inputs, result in test_values:
-            test_result = cls.check_result(func, inputs, result)
+            timings.count("tests_checked")
+            with execution_budget(budget), timings.span("tests"):
+                test_result = cls.check_result(func, inputs, result)
             if test_result["passed"]:
                 passed_tests.append(test_result["message"])
             else:
@@ -672,6 +829,32 @@ class ExerciseStep(Step):
 
         return return_value
 
+    @classmethod
+    def _reuse_run_output(cls, submission, memo_key, initial_names):
+        """
+        Uses the output of running the submission normally as the result of the
+        test for the user's own initial values, if the run used the same stdin
+        and running the code again would give the same output.
+        """
+        if not (submission.run_output and getattr(cls.solution, "returns_stdout", False)):
+            return
+
+        # Running the initial assignments mustn't have side effects such as output
+        for node in submission.tree.body[:len(cls.arg_names())]:
+            try:
+                ast.literal_eval(node.value)
+            except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+                return
+
+        stdin_input = cls.stdin_input
+        if isinstance(stdin_input, str):
+            stdin_input = stdin_input.splitlines()
+        input_values, output = submission.run_output
+        if input_values != stdin_input[:len(input_values)]:
+            return
+
+        submission.add_evaluation(memo_key, initial_names, output)
+
     @classmethod
     def wrap_solution(cls, func):
         return func
@@ -691,6 +874,20 @@ class ExerciseStep(Step):
 
     @classmethod
     def test_values(cls):
+        """
+        Yields pairs of (inputs, expected result) to test a submission against,
+        first from `tests` and then randomly generated.
+        These are precomputed at build time (see `step_record`) when possible,
+        otherwise they are generated lazily so that checking can stop at the first failing test.
+        """
+        if cls.serialized_test_values:
+            for test_value in cls.serialized_test_values:
+                yield deserialize_test_value(test_value)
+        else:
+            yield from cls.generate_test_values()
+
+    @classmethod
+    def generate_test_values(cls):
         tests = cls.tests
         if isinstance(tests, dict):
             tests = tests.items()
@@ -709,12 +906,22 @@ class ExerciseStep(Step):
                 result = cls.solution(**inputs)
             yield inputs, result
 
-        for _ in range(10):
-            inputs = cls.generate_inputs()
-            inputs = t.translate_dict_keys(inputs)
-            result = cls.solution(**inputs)
+        # Use the same random inputs every time for a given step
+        seeded_random = SeededRandom(zlib.crc32(cls.text_msgid.encode()))
+        for _ in range(cls.num_random_tests):
+            with seeded_random.activate():
+                inputs = cls.generate_inputs()
+                inputs = t.translate_dict_keys(inputs)
+                result = cls.solution(**inputs)
             yield inputs, result
 
+    @classmethod
+    def serialize_test_values(cls):
+        result = [serialize_test_value(test_value) for test_value in cls.generate_test_values()]
+        if None in result:
+            return None
+        return result
+
     @classmethod
     def test_exercise(cls, func):
         for inputs, result in cls.test_values():
@@ -746,21 +953,27 @@ class VerbatimStep(Step):
 
     def check(self):
         try:
-            if result:= self.truncated_trees_match(
-                self.tree,
-                ast.parse(self.program),
-            ):
+            if result := self.truncated_trees_match(self.tree):
                 return result
         except SyntaxError:
             pass
 
-        if self.truncated_trees_match(
-            ast.parse(self.input.lower()),
-            ast.parse(self.program.lower()),
-        ):
+        if self.truncated_trees_match(ast.parse(self.input.lower()), lower=True):
             return dict(message=t.Terms.case_sensitive)
 
-    def truncated_trees_match(self, input_tree, program_tree):
+    @classmethod
+    @cache
+    def parsed_program(cls, lower):
+        """
+        Returns the tree of the (optionally lowercased) program and its dump,
+        which is compared with the dump of the input before doing a detailed comparison.
+        """
+        program = cls.program.lower() if lower else cls.program
+        tree = ast.parse(program)
+        return tree, ast.dump(tree)
+
+    def truncated_trees_match(self, input_tree, lower=False):
+        program_tree, program_dump = self.parsed_program(lower)
         body = [
             stmt
             for stmt in input_tree.body
@@ -770,6 +983,9 @@ class VerbatimStep(Step):
             body=body[:len(program_tree.body)],
             type_ignores=[],
         )
+        if ast.dump(input_tree) == program_dump:
+            return True
+        # Compare in detail, e.g. to tell the user when only the spaces in a string differ
         return self.are_trees_equal(input_tree, program_tree)
 
     def are_trees_equal(self, t1, t2):
@@ -831,6 +1047,145 @@ def search_ast(node, template, predicate=lambda n: True):
     )
 
 
+def compile_template(template):
+    """
+    Returns a function `check(node)` equivalent to the template matching in `search_ast`,
+    i.e. `isinstance` for a type or tuple and `is_ast_like` for a partial AST.
+    The template is only inspected once, here, rather than once per node checked.
+    """
+    if isinstance(template, (type, tuple)):
+        return lambda node: isinstance(node, template)
+    return _compile_ast_template(template, ["tree"])
+
+
+def _compile_ast_template(template, path):
+    # Mirrors astcheck.assert_ast_like, with the paths computed up front
+    if callable(template):
+        return _compile_checker(template, path)
+
+    template_type = type(template)
+    field_checks = []
+    for name, template_field in ast.iter_fields(template):
+        field_path = path + [name]
+        if isinstance(template_field, list):
+            if template_field and (isinstance(template_field[0], ast.AST) or callable(template_field[0])):
+                check = _compile_node_list(template_field, field_path)
+            else:
+                check = partial(operator.eq, template_field)
+        elif isinstance(template_field, ast.AST):
+            check = _compile_ast_template(template_field, field_path)
+        elif callable(template_field):
+            check = _compile_checker(template_field, field_path)
+        else:
+            check = partial(operator.eq, template_field)
+        field_checks.append((name, check))
+
+    def check_node(sample):
+        if not isinstance(sample, template_type):
+            return False
+        for field_name, check_field in field_checks:
+            if not check_field(getattr(sample, field_name)):
+                return False
+        return True
+
+    return check_node
+
+
+def _compile_node_list(template, path):
+    checks = [_compile_ast_template(node, path + [i]) for i, node in enumerate(template)]
+
+    def check_list(sample):
+        return len(sample) == len(checks) and all(
+            check(node) for check, node in zip(checks, sample)
+        )
+
+    return check_list
+
+
+def _compile_checker(checker, path):
+    def check(sample):
+        try:
+            checker(sample, path)
+        except ASTMismatch:
+            return False
+        return True
+
+    return check
+
+
+class TemplateMatcher:
+    """
+    Counts matches for several `search_ast` style rules in one walk over a tree.
+
+    `rules` maps arbitrary keys to `(template, predicate)` pairs,
+    where `predicate` may be None. `counts(node)` returns a dict with the same keys
+    and the values that `search_ast(node, template, predicate)` would give.
+    Each node is only checked against the rules that could match its type.
+    """
+
+    def __init__(self, rules):
+        self.keys = list(rules)
+        self.rules = []
+        for template, predicate in rules.values():
+            if isinstance(template, tuple):
+                template_types = template
+            elif isinstance(template, type):
+                template_types = (template,)
+            elif isinstance(template, ast.AST):
+                template_types = (type(template),)
+            else:
+                # A checker function at the top level could match anything
+                template_types = None
+            self.rules.append((template_types, compile_template(template), predicate))
+        self._rules_by_type = {}
+
+    def rules_for_type(self, node_type):
+        try:
+            return self._rules_by_type[node_type]
+        except KeyError:
+            pass
+        result = self._rules_by_type[node_type] = [
+            (i, check, predicate)
+            for i, (template_types, check, predicate) in enumerate(self.rules)
+            if template_types is None
+            or any(
+                # The reverse direction allows e.g. ast.Str to match ast.Constant nodes
+                issubclass(node_type, template_type) or issubclass(template_type, node_type)
+                for template_type in template_types
+            )
+        ]
+        return result
+
+    def counts(self, node):
+        counts = [0] * len(self.rules)
+        if self.rules:
+            rules_for_type = self.rules_for_type
+            for child in walk_descendants(node):
+                for i, check, predicate in rules_for_type(type(child)):
+                    if check(child) and (predicate is None or predicate(child)):
+                        counts[i] += 1
+        return dict(zip(self.keys, counts))
+
+
+def walk_descendants(node):
+    """
+    Like `ast.walk` without `node` itself, in no particular order.
+    """
+    todo = [node]
+    while todo:
+        node = todo.pop()
+        for name in node._fields:
+            value = getattr(node, name, None)
+            if isinstance(value, ast.AST):
+                todo.append(value)
+                yield value
+            elif isinstance(value, list):
+                for item in value:
+                    if isinstance(item, ast.AST):
+                        todo.append(item)
+                        yield item
+
+
 def load_chapters():
     chapters_dir = Path(__file__).parent / "chapters"
     path: Path
@@ -849,13 +1204,25 @@ def load_chapters():
         yield dict(slug=slug, title=title, pages=chapter_pages)
 
 
+def page_modules():
+    return {slug: page.__module__ for slug, page in pages.items()}
+
+
 @cache
 def get_pages():
+    return get_pages_with_steps({})
+
+
+def get_pages_with_steps(known_step_dicts):
+    """
+    Like get_pages, but the step_dicts of pages whose slugs are in known_step_dicts
+    are taken from there instead of cleaning all their steps.
+    """
     return dict(
         pages={
             slug: dict(
                 **select_attrs(page, "slug title index step_names"),
-                steps=page.step_dicts,
+                steps=known_step_dicts[slug] if slug in known_step_dicts else page.step_dicts,
             )
             for slug, page in pages.items()
         },
@@ -872,8 +1239,10 @@ def iter_step_names(*, final_text: bool):
             yield page, step_name
 
 
-def step_test_entries():
+def step_test_entries(page_slugs=None):
     for page, step_name in iter_step_names(final_text=False):
+        if page_slugs is not None and page.slug not in page_slugs:
+            continue
         step = page.get_step(step_name)
 
         for substep in [*step.messages, *get_special_messages(step), step]:
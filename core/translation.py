@@ -58,7 +58,10 @@ def get(msgid, default):
     result = translation.gettext(msgid)
     if result == msgid:
         assert (
-            msgid.startswith(("code_bits."))
+            msgid.startswith("code_bits.")
+            # english.po is generated from the code, so it has every term,
+            # but other languages may not have translated the newest terms yet.
+            or (msgid.startswith("misc_terms.") and current_language != "en")
             or "output_prediction_choices" in msgid
             or ".disallowed." in msgid
         )
@@ -404,6 +407,13 @@ to the top of your code."""
 
     no_more_test_inputs = "No more test inputs - solution should have finished by now"
 
+    output_truncated = "[Output after the first {max_length} characters was not shown]"
+
+    code_took_too_long = (
+        "Your code took too long to run, so it was stopped. "
+        "Check for loops that never end or functions that call themselves too many times."
+    )
+
     syntax_error_at_line = "at line"
 
 
@@ -115,9 +115,7 @@ def make_test_input_callback(stdin_input: Union[str, list]):
 
     def input_callback(_data=None):
         if stdin_input:
-            result = stdin_input.pop()
-            print(f"<input: {result}>")
-            return result
+            return stdin_input.pop()
         else:
             raise ValueError(t.Terms.no_more_test_inputs)
 
@@ -134,7 +132,9 @@ def add_stdin_input_arg(func):
 
         def patched_input(prompt=""):
             print(prompt, end="")
-            return input_callback()
+            result = input_callback()
+            print(f"<input: {result}>")
+            return result
 
         builtins.input = patched_input
 
@@ -164,13 +164,40 @@ def format_exception_string():
     return ''.join(traceback.format_exception_only(*sys.exc_info()[:2]))
 
 
-def highlighted_markdown_and_codes(text):
-    from markdown import markdown
+# Markdown instances not currently converting anything.
+# Creating one with all its processors takes longer than converting most texts.
+_markdown_pool = []
+
+
+def _convert_markdown(text):
+    from markdown import Markdown
     from .markdown_extensions import HighlightPythonExtension
 
-    extension = HighlightPythonExtension()
-    extension.codes = []
-    return markdown(text, extensions=[extension, 'markdown.extensions.tables']), extension.codes
+    if _markdown_pool:
+        md, extension = _markdown_pool.pop()
+    else:
+        extension = HighlightPythonExtension()
+        md = Markdown(extensions=[extension, 'markdown.extensions.tables'])
+
+    codes = extension.processor.codes = []
+    try:
+        return md.convert(text), codes
+    finally:
+        md.reset()
+        _markdown_pool.append((md, extension))
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_markdown_and_codes(text, language):
+    html, codes = _convert_markdown(text)
+    return html, tuple(codes)
+
+
+def highlighted_markdown_and_codes(text):
+    # Messages, hints and lint messages are mostly the same for many submissions.
+    # The language is part of the key because the result can include Terms.copy_button.
+    html, codes = _cached_markdown_and_codes(text, t.current_language)
+    return html, [dict(code) for code in codes]
 
 
 def highlighted_markdown(text):
@@ -38,3 +38,14 @@ export async function runCodeTask(entry, outputCallback, inputCallback) {
     running = false;
   }
 }
+
+// Returns the friendly and didyoumean explanations of a traceback given its handle.
+// They're empty if the worker has been restarted or has forgotten the traceback since.
+export async function explainTraceback(handle) {
+  try {
+    return await taskClient.workerProxy.explainTraceback(handle);
+  } catch (e) {
+    console.error(e);
+    return {didyoumean: [], friendly: ""};
+  }
+}
@@ -4,6 +4,9 @@
 
 import * as Comlink from 'comlink';
 import pythonCoreUrl from "./python_core.tar.load_by_url"
+import tracebacksBundleUrl from "./python_bundles/tracebacks.tar.load_by_url"
+import explanationsBundleUrl from "./python_bundles/explanations.tar.load_by_url"
+import sentryBundleUrl from "./python_bundles/sentry.tar.load_by_url"
 import {
   loadPyodideAndPackage,
   makeRunnerCallback,
@@ -13,12 +16,21 @@ import {
 
 const reloader = new PyodideFatalErrorReloader(async () => {
   const pyodide = await loadPyodideAndPackage({url: pythonCoreUrl, format: "tar"});
-  pyodide.pyimport("core.init_pyodide").init(process.env.REACT_APP_LANGUAGE);
+  // Must match feature_bundles in scripts/generate_static_files.py.
+  // Each bundle is fetched when one of its modules is first imported.
+  pyodide.pyimport("core.init_pyodide").init(process.env.REACT_APP_LANGUAGE, {
+    tracebacks: tracebacksBundleUrl,
+    explanations: explanationsBundleUrl,
+    sentry: sentryBundleUrl,
+  });
   return pyodide;
 });
 
 let programCount = 1;
 
+// Must match core.checker.result_schema_version
+const RESULT_SCHEMA_VERSION = 1;
+
 const runCode = pyodideExpose(
   async function (extras, entry, outputCallback, inputCallback) {
     let outputPromise;
@@ -39,11 +51,25 @@ const runCode = pyodideExpose(
 
       const checkerModule = pyodide.pyimport("core.checker");
       checkerModule.default_runner.set_filename(`/my_program_${programCount++}.py`)
-      const result = checkerModule.check_entry(entry, callback);
+      const resultJson = checkerModule.check_entry_json(entry, callback);
       await outputPromise;
-      return result.toJs({dict_converter: Object.fromEntries});
+      const {schema_version, result} = JSON.parse(resultJson);
+      if (schema_version !== RESULT_SCHEMA_VERSION) {
+        throw new Error(`Expected result schema version ${RESULT_SCHEMA_VERSION}, got ${schema_version}`);
+      }
+      return result;
     });
   },
 );
 
-Comlink.expose({runCode});
+// Called after runCode has finished for each traceback shown,
+// since the explanations take much longer to compute than the traceback itself.
+async function explainTraceback(handle) {
+  return await reloader.withPyodide(async (pyodide) => {
+    const checkerModule = pyodide.pyimport("core.checker");
+    const result = checkerModule.explain_traceback(handle);
+    return result.toJs({dict_converter: Object.fromEntries});
+  });
+}
+
+Comlink.expose({runCode, explainTraceback});
@@ -1,10 +1,11 @@
-import React, {Component, useState, useRef, useLayoutEffect} from 'react'
+import React, {Component, useState, useRef, useLayoutEffect, useEffect} from 'react'
 import AnsiUp from "ansi_up";
 
 import sourceStyles from './defs/styles/TerminalMessage'
 import terms from "../terms.json"
 import _ from "lodash";
 import {InternalError} from "../Feedback";
+import {explainTraceback} from "../TaskClient";
 
 const ansi_up = new AnsiUp();
 
@@ -66,6 +67,10 @@ const Tracebacks = ({data, codeSource}) => {
             !simple && traceback.frames.map((frame, frameIndex) =>
               frame.type === "frame" ?
                 <Frame frame={frame} key={frameIndex}/>
+                : frame.type === "omitted_frames" ?
+                <div className="traceback-repeated-frames" key={frameIndex}>
+                  {framesOmitted(frame)}
+                </div>
                 :
                 <RepeatedFrames frames={frame.frames} key={frameIndex}/>
             )
@@ -75,21 +80,8 @@ const Tracebacks = ({data, codeSource}) => {
               <strong>{traceback.exception.type}: </strong>{traceback.exception.message}
             </span>
             {" "}
-            <FriendlyMessage friendly={traceback.friendly}/>
+            <TracebackExplanation traceback={traceback}/>
           </div>
-          {
-            traceback.didyoumean.length > 0 &&
-            <div className="traceback-didyoumean">
-              <i>{terms.did_you_mean}</i>
-              <ul>
-                {
-                  traceback.didyoumean.map((suggestion, suggestionIndex) =>
-                    <li key={suggestionIndex}>{suggestion}?</li>
-                  )
-                }
-              </ul>
-            </div>
-          }
           {
             traceback.tail && <div className="traceback-tail">{traceback.tail}</div>
           }
@@ -99,6 +91,50 @@ const Tracebacks = ({data, codeSource}) => {
   </div>;
 }
 
+// Explanations already fetched from the worker, by traceback object,
+// so they don't need to be fetched again when the terminal rerenders.
+const explanations = new WeakMap();
+
+const TracebackExplanation = ({traceback}) => {
+  const [explanation, setExplanation] = useState(explanations.get(traceback));
+  useEffect(() => {
+    if (explanation) {
+      return;
+    }
+    let cancelled = false;
+    explainTraceback(traceback.explanation).then(result => {
+      explanations.set(traceback, result);
+      if (!cancelled) {
+        setExplanation(result);
+      }
+    });
+    return () => {
+      cancelled = true;
+    };
+  }, [traceback, explanation]);
+
+  if (!explanation) {
+    return null;
+  }
+
+  return <>
+    <FriendlyMessage friendly={explanation.friendly}/>
+    {
+      explanation.didyoumean.length > 0 &&
+      <div className="traceback-didyoumean">
+        <i>{terms.did_you_mean}</i>
+        <ul>
+          {
+            explanation.didyoumean.map((suggestion, suggestionIndex) =>
+              <li key={suggestionIndex}>{suggestion}?</li>
+            )
+          }
+        </ul>
+      </div>
+    }
+  </>;
+}
+
 const Frame = ({frame}) =>
   <div className="traceback-frame">
     {frame.name !== "<module>" && <div className="traceback-frame-name">{frame.name}:</div>}
@@ -133,6 +169,8 @@ const Frame = ({frame}) =>
 
 const repeatedFramesDescription = _.template(terms.repeated_frames_description);
 
+const framesOmitted = _.template(terms.frames_omitted);
+
 const RepeatedFrames = ({frames}) =>
   <div className="traceback-repeated-frames">
     <div>{terms.similar_frames_skipped}</div>
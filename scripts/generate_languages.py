@@ -0,0 +1,98 @@
+"""
+Runs generate_static_files and the golden transcript check of tests/test_steps.py
+for several languages at once, each language in its own process.
+generate.sh uses this instead of running them for one language after another.
+
+    python -m scripts.generate_languages en fr es
+
+The languages default to FUTURECODER_LANGUAGES (space separated) or just `en`.
+FIX_TESTS and FIX_CORE_IMPORTS work as usual.
+
+The files generated under frontend are shared by all languages,
+so they're only written for the last language given, as when generate.sh looped over the languages.
+The other languages are still generated in full to check for errors.
+
+When a language fails, the languages which haven't started yet are cancelled,
+and the error is shown once the ones already running have finished.
+"""
+
+import argparse
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def generate_language(lang, write_files, test_workers):
+    # Importing core replaces sys.modules["__main__"] with the runner's module,
+    # which stops functions in this module from being sent to the pool, so only the workers import it.
+    from scripts import generate_static_files
+    from tests.test_steps import check_transcript
+
+    os.environ["FUTURECODER_LANGUAGE"] = lang
+    timings = {}
+
+    start = time.perf_counter()
+    roots = generate_static_files.main(write_files)
+    timings["generate"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    check_transcript(lang, test_workers)
+    timings["test_steps"] = time.perf_counter() - start
+
+    return roots, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("languages", nargs="*", default=os.environ.get("FUTURECODER_LANGUAGES", "en").split())
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    languages = args.languages
+
+    # Spare processes go to test_steps, which divides pages between them.
+    test_workers = max(1, args.workers // len(languages))
+    results = {}
+    start = time.perf_counter()
+
+    # Each language needs a fresh process since the pages are translated when they're first loaded.
+    with ProcessPoolExecutor(min(args.workers, len(languages)), max_tasks_per_child=1) as executor:
+        futures = {
+            executor.submit(generate_language, lang, lang == languages[-1], test_workers): lang
+            for lang in languages
+        }
+        for future in as_completed(futures):
+            lang = futures[future]
+            try:
+                results[lang] = future.result()
+            except Exception:
+                traceback.print_exc()
+                print(f"Failed to generate files for {lang}", file=sys.stderr)
+                for other in futures:
+                    other.cancel()
+                break
+
+    if len(results) < len(languages):
+        sys.exit(1)
+
+    wall_time = time.perf_counter() - start
+
+    print(f"\n{'language':<10}{'generate':>10}{'test_steps':>12}{'total':>10}")
+    for lang in languages:
+        timings = results[lang][1]
+        print(
+            f"{lang:<10}{timings['generate']:>9.1f}s{timings['test_steps']:>11.1f}s"
+            f"{sum(timings.values()):>9.1f}s"
+        )
+    total = sum(sum(timings.values()) for _, timings in results.values())
+    print(f"{total:.1f}s in total, {wall_time:.1f}s wall time")
+
+    roots = results[languages[-1]][0]
+    different = [lang for lang in languages if results[lang][0] != roots]
+    if different:
+        sys.exit(f"Languages {different} import different packages from {languages[-1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,37 +3,66 @@ Run this file to generate various files under frontend/src including:
 
 - chapters.json
 - python_core.tar.load_by_url
+- python_bundles/*.tar.load_by_url, see feature_bundles
 - book/pages.json.load_by_url
 
 When developing, you generally want this to run any time you make a change to the code.
-You probably want a file watcher utility to do this for you automatically.
-For example, you could use watchdog (https://github.com/gorakhargosh/watchdog):
-
-    pip install 'watchdog[watchmedo]'
-    watchmedo shell-command core \
-        --recursive \
-        --ignore-directories \
-        --ignore-pattern '*~' \
-        --drop \
-        --command "python -m scripts.generate_static_files"
+To do that automatically, run:
+
+    python -m scripts.generate_static_files --watch
+
+This checks for changes to the files in core and translations twice a second
+and then rebuilds incrementally, as with `--incremental`.
+An incremental build fingerprints its inputs and stores the results in frontend/generate_cache,
+so that the next build only cleans the steps of chapters whose modules changed,
+and skips everything if nothing changed.
+Any other change to core, the translations or the installed packages rebuilds everything.
+core_imports.txt may then list packages which are no longer imported until the next full build.
 """
 
+import argparse
+import hashlib
+import importlib.metadata
+import importlib.util
+import json
 import os
+import platform
+import py_compile
 import random
 import shutil
+import subprocess
 import sys
 import tarfile
+import tempfile
+import time
+import tomllib
+from io import BytesIO
 from pathlib import Path
 
+if os.environ.get("FUTURECODER_TREE_SHAKE"):
+    # Before any third party packages, to see which of their files are opened.
+    # Otherwise the audit hook it adds would only slow down the build.
+    from scripts import tree_shaking
+
 import birdseye
 from littleutils import strip_required_prefix, json_to_file, file_to_json
 from markdown import markdown
 
 from core import translation as t
-from core.checker import check_entry
+from core.checker import check_entry, explain_traceback
+from core.init_pyodide import bundles_path
 from core.runner.utils import site_packages
-from core.text import get_pages, step_test_entries, load_chapters
-from core.utils import unwrapped_markdown, new_tab_links
+from core.text import (
+    get_pages_with_steps,
+    pages,
+    step_test_entries,
+    load_chapters,
+    page_modules,
+    page_modules_path,
+    get_step_records,
+    step_records_path,
+)
+from core.utils import unwrapped_markdown, new_tab_links, internal_error_result
 
 str("import sentry_sdk after core.utils for stubs")
 import sentry_sdk  # noqa imported lazily
@@ -41,17 +70,62 @@ import sentry_sdk  # noqa imported lazily
 core_dir = Path(__file__).parent.parent / "core"
 frontend = core_dir / "../frontend"
 frontend_src = frontend / "src"
+translations_dir = core_dir.parent / "translations"
+build_cache_dir = frontend / "generate_cache"
+build_cache_path = build_cache_dir / "build.json"
+dependencies_tar_path = build_cache_dir / "dependencies.tar"
+bundles_dir = frontend_src / "python_bundles"
+
+# Packages which are only needed for some features, e.g. showing a traceback.
+# They're left out of python_core.tar and written to bundles in bundles_dir instead,
+# which core.init_pyodide fetches when one of their modules is first imported.
+# Any other package goes in python_core.tar.
+feature_bundles = dict(
+    # snoop imports birdseye if it can, and tracebacks import snoop.
+    tracebacks=["stack_data", "cheap_repr", "snoop", "birdseye"],
+    explanations=["friendly_traceback", "didyoumean"],
+    sentry=["sentry_sdk"],
+)
+
+# Where the files in python_core.tar end up in Pyodide, i.e. the working directory when it's extracted
+pyodide_home = "/home/pyodide"
 
 # Consistently generate the same files
 random.seed(0)
 
 def run_steps():
+    def callback(event_type, data):
+        # Explanations of tracebacks are only computed when they're requested,
+        # so request them to import what they need.
+        if event_type == "output":
+            for part in data["parts"]:
+                if part["type"] == "traceback":
+                    for traceback in part["data"]:
+                        explain_traceback(traceback["explanation"])
+        return 0
+
     for *_, entry in step_test_entries():
-        check_entry(entry, lambda *_: 0)
+        check_entry(entry, callback)
+        if os.environ.get("FUTURECODER_TREE_SHAKE") and "\n" in entry["input"]:
+            # Steps only run code one way, but users can run any program in these ways too,
+            # and tree shaking leaves out anything that isn't used here.
+            for extra in [
+                dict(source="snoop"),
+                dict(source="birdseye"),
+                dict(question_wizard=True, expected_output="?"),
+            ]:
+                check_entry({**entry, **extra}, callback)
+
+    if os.environ.get("FUTURECODER_TREE_SHAKE"):
+        try:
+            raise ValueError("Imports what reporting internal errors needs")
+        except ValueError as e:
+            internal_error_result(e)
 
 
-def get_roots():
-    run_steps()
+def get_roots(run_all_steps=True):
+    if run_all_steps:
+        run_steps()
     roots = set()
     mod_names = []
     for module in list(sys.modules.values()):
@@ -91,6 +165,191 @@ def tarfile_filter(tar_info):
     return tar_info
 
 
+def add_json(tar, arcname, data):
+    content = json.dumps(data).encode()
+    tar_info = tarfile.TarInfo(arcname)
+    tar_info.size = len(content)
+    tar.addfile(tar_info, BytesIO(content))
+
+
+def file_hashes(path):
+    if path.is_file():
+        files = [path]
+    else:
+        files = sorted(f for f in path.rglob("*") if f.is_file() and "__pycache__" not in f.parts)
+    return {
+        str(f.relative_to(core_dir.parent)): hashlib.sha256(f.read_bytes()).hexdigest()
+        for f in files
+    }
+
+
+def input_fingerprints():
+    """
+    Returns dict(shared=..., chapters={module_name: hash}).
+    `shared` covers all the inputs apart from the chapter modules.
+    """
+    chapters = {}
+    shared = dict(
+        language=t.current_language,
+        dependencies=sorted(f"{dist.metadata['Name']}=={dist.version}" for dist in importlib.metadata.distributions()),
+        bytecode=[os.environ.get("FUTURECODER_BYTECODE"), os.environ.get("FUTURECODER_DROP_SOURCES")],
+        tree_shake=os.environ.get("FUTURECODER_TREE_SHAKE"),
+    )
+    for paths in [
+        [core_dir],
+        [translations_dir / "locales" / str(t.current_language), translations_dir / "codes.json"],
+        [frontend_src / "english_terms.json"],
+    ]:
+        for path in paths:
+            if not path.exists():
+                continue
+            for name, digest in file_hashes(path).items():
+                if name.startswith("core/chapters/"):
+                    chapters["core.chapters." + Path(name).stem] = digest
+                elif name != "core/core_imports.txt":
+                    shared[name] = digest
+    shared = hashlib.sha256(json.dumps(shared, sort_keys=True).encode()).hexdigest()
+    return dict(shared=shared, chapters=chapters)
+
+
+def check_bytecode_version():
+    # Bytecode only works in the same minor version of Python, i.e. the one in Pyodide.
+    pyproject = tomllib.loads((core_dir.parent / "pyproject.toml").read_text())
+    target = pyproject["tool"]["poetry"]["dependencies"]["python"]
+    if tuple(map(int, target.split(".")[:2])) != sys.version_info[:2]:
+        raise ValueError(
+            f"FUTURECODER_BYTECODE requires Python {target} as in pyproject.toml, "
+            f"not {platform.python_version()}"
+        )
+
+
+def add_files(tar, path, arcname, *, third_party, filter=tarfile_filter):
+    """
+    Like tar.add(path, arcname, filter=filter), also adding bytecode for .py files
+    if FUTURECODER_BYTECODE is set, so that Pyodide doesn't compile them when they're imported.
+    With FUTURECODER_DROP_SOURCES also set, the .py files of third party packages are left out,
+    leaving only their bytecode.
+    """
+    if not os.environ.get("FUTURECODER_BYTECODE"):
+        tar.add(path, arcname=arcname, recursive=True, filter=filter)
+        return
+
+    drop_sources = third_party and os.environ.get("FUTURECODER_DROP_SOURCES")
+    bytecode = []
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        def bytecode_filter(tar_info):
+            tar_info = filter(tar_info)
+            if not (tar_info and tar_info.name.endswith(".py")):
+                return tar_info
+
+            source_path = Path(path) / Path(tar_info.name).relative_to(arcname)
+            cfile = Path(temp_dir) / tar_info.name
+            try:
+                # The files can't change in the tar, so there's no need to check them against the source.
+                # Without the source, co_filename stays as `dfile`, and packages such as python_runner
+                # find their own directory from it, so it must be where the file will be.
+                py_compile.compile(
+                    str(source_path),
+                    cfile=str(cfile),
+                    dfile=f"{pyodide_home}/{tar_info.name}",
+                    doraise=True,
+                    invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+                )
+            except py_compile.PyCompileError:
+                # e.g. files for other versions of Python which are never imported
+                return tar_info
+
+            if drop_sources:
+                bytecode.append((tar_info.name[:-3] + ".pyc", cfile))
+                return None
+            else:
+                bytecode.append((importlib.util.cache_from_source(tar_info.name), cfile))
+                return tar_info
+
+        tar.add(path, arcname=arcname, recursive=True, filter=bytecode_filter)
+        for bytecode_arcname, cfile in bytecode:
+            tar.add(cfile, arcname=bytecode_arcname)
+
+
+def write_if_changed(path, content):
+    # Unchanged files keep their modification time, so the frontend doesn't reload them.
+    if not path.exists() or path.read_text() != content:
+        path.write_text(content)
+
+
+def split_roots(roots):
+    """
+    Returns {bundle_name: roots} for the feature bundles, plus "core" for python_core.tar.
+    """
+    result = {
+        name: [root for root in roots if root.removesuffix(".py") in modules]
+        for name, modules in feature_bundles.items()
+    }
+    bundled = {root for bundle in result.values() for root in bundle}
+    result["core"] = [root for root in roots if root not in bundled]
+    return result
+
+
+def check_startup_imports(bundle_roots):
+    # Bundles only help if starting up doesn't import them, which would fetch them straight away.
+    code = "import sys, core.init_pyodide; core.init_pyodide.init(sys.argv[1]); import core.checker; print(*sys.modules)"
+    output = subprocess.check_output([sys.executable, "-c", code, t.current_language], cwd=core_dir.parent)
+    imported = set(output.decode().split())
+    for name in feature_bundles:
+        for root in bundle_roots[name]:
+            if root.removesuffix(".py") in imported:
+                raise ValueError(f"{root} is in the {name} bundle but it's imported when the worker starts up")
+
+
+def add_dependencies(tar, roots, files=None):
+    """
+    Adds the packages in `roots`, or only the given files in them from tree shaking.
+    """
+    if "friendly_traceback" in roots and t.current_language not in (None, "en"):
+        arcname = f"friendly_traceback/locales/{t.current_language}/LC_MESSAGES/friendly_tb_{t.current_language}.mo"
+        source_path = Path(site_packages) / arcname
+        if source_path.exists():
+            tar.add(source_path, arcname=arcname)
+
+    for root in roots:
+        if files is None:
+            add_files(tar, Path(site_packages) / root, root, third_party=True)
+        else:
+            for arcname in files:
+                if arcname.split(os.path.sep)[0] == root:
+                    add_files(tar, Path(site_packages) / arcname, arcname, third_party=True)
+    if "pygments" in roots:
+        for filename in ("__init__.py", "_mapping.py", "python.py"):
+            arcname = str("pygments/lexers/" + filename)
+            add_files(tar, Path(site_packages) / arcname, arcname, third_party=True, filter=lambda tar_info: tar_info)
+
+
+def print_tree_shaking_report(roots, files):
+    print(f"{'package':<30}{'files':>15}{'size':>23}")
+    totals = [0, 0, 0, 0]
+    for root in roots:
+        path = Path(site_packages) / root
+        counts = [0, 0, 0, 0]
+        for f in [path] if path.is_file() else sorted(path.rglob("*")):
+            arcname = str(f.relative_to(site_packages))
+            if not (f.is_file() and tarfile_filter(tarfile.TarInfo(arcname))):
+                continue
+            size = f.stat().st_size
+            counts[0] += 1
+            counts[2] += size
+            if arcname in files:
+                counts[1] += 1
+                counts[3] += size
+        totals = [total + count for total, count in zip(totals, counts)]
+        print(f"{root:<30}{counts[1]:>7} / {counts[0]:<7}{counts[3] / 1e3:>9.0f} / {counts[2] / 1e3:<6.0f} kB")
+    print(f"{'total':<30}{totals[1]:>7} / {totals[0]:<7}{totals[3] / 1e3:>9.0f} / {totals[2] / 1e3:<6.0f} kB")
+
+
+def bundle_paths():
+    return [bundles_dir / f"{name}.tar.load_by_url" for name in feature_bundles]
+
+
 def frontend_terms():
     for key, value in file_to_json(frontend_src / "english_terms.json").items():
         translation = t.get(f"frontend.{key}", value)
@@ -109,55 +368,189 @@ def frontend_terms():
         yield key, result
 
 
-def main():
+def main(write_files=True, incremental=False):
+    """
+    Generates the files for the language in FUTURECODER_LANGUAGE and returns the roots of core_imports.txt.
+    With write_files=False everything is still generated (so errors are raised)
+    but nothing is written, since the files are shared by all languages.
+    That's used by scripts.generate_languages for all but one language.
+    With incremental=True the results of the last build are reused where their inputs haven't changed.
+    """
     print("Generating files...")
     t.set_language(os.environ.get("FUTURECODER_LANGUAGE", "en"))
+    if os.environ.get("FUTURECODER_BYTECODE"):
+        check_bytecode_version()
 
-    json_to_file(list(load_chapters()), frontend_src / "chapters.json")
-    json_to_file(get_pages(), frontend_src / "book/pages.json.load_by_url")
-    json_to_file(dict(frontend_terms()), frontend_src / "terms.json", indent=4)
+    chapters = list(load_chapters())
+    fingerprints = input_fingerprints()
+    previous = {}
+    if incremental and write_files and build_cache_path.exists():
+        previous = file_to_json(build_cache_path)
+        if previous["shared"] != fingerprints["shared"]:
+            previous = {}
 
     birdseye_dest = frontend / "public/birdseye"
-    shutil.rmtree(birdseye_dest, ignore_errors=True)
-    shutil.copytree(Path(birdseye.__file__).parent / "static", birdseye_dest, dirs_exist_ok=True)
-
-    roots = get_roots()
-    core_imports = "\n".join(roots)
-    core_imports_path = core_dir / "core_imports.txt"
-    if os.environ.get("FIX_CORE_IMPORTS"):
-        core_imports_path.write_text(core_imports)
-    elif core_imports_path.read_text() != core_imports:
-        raise ValueError(
-            f"core_imports.txt is out of date, run with FIX_CORE_IMPORTS=1.\n"
-            f"{core_imports}\n!=\n{core_imports_path.read_text()}"
-        )
+    outputs = [
+        frontend_src / "chapters.json",
+        frontend_src / "book/pages.json.load_by_url",
+        frontend_src / "terms.json",
+        frontend_src / "python_core.tar.load_by_url",
+        *bundle_paths(),
+        birdseye_dest,
+    ]
+    if previous.get("chapters") == fingerprints["chapters"] and all(path.exists() for path in outputs):
+        print("Nothing changed.")
+        return previous["roots"]
+
+    # Pages from unchanged chapter modules are taken from the last build instead of cleaning their steps again.
+    previous_chapters = previous.get("chapters", {})
+    known_slugs = [
+        slug
+        for slug, page in pages.items()
+        if slug in previous.get("pages", {})
+        and previous_chapters.get(page.__module__) == fingerprints["chapters"].get(page.__module__)
+    ]
+    changed_slugs = [slug for slug in pages if slug not in known_slugs]
+
+    pages_json = get_pages_with_steps({slug: previous["pages"][slug] for slug in known_slugs})
+    step_records_by_page = {slug: previous["step_records"][slug] for slug in known_slugs}
+    step_records_by_page.update({slug: get_step_records({slug}) for slug in changed_slugs})
+    step_records = {
+        msgid: record
+        for slug in pages
+        for msgid, record in step_records_by_page[slug].items()
+    }
+
+    terms = dict(frontend_terms())
+    if write_files:
+        write_if_changed(frontend_src / "chapters.json", json.dumps(chapters))
+        write_if_changed(frontend_src / "book/pages.json.load_by_url", json.dumps(pages_json))
+        write_if_changed(frontend_src / "terms.json", json.dumps(terms, indent=4))
+
+        if not (previous and birdseye_dest.exists()):
+            shutil.rmtree(birdseye_dest, ignore_errors=True)
+            shutil.copytree(Path(birdseye.__file__).parent / "static", birdseye_dest, dirs_exist_ok=True)
+
+    if previous:
+        # The code that checks steps hasn't changed, so running the steps would import the same packages.
+        # Only the chapter modules and cleaning their steps may have imported new ones.
+        roots = sorted(set(previous["roots"]) | set(get_roots(run_all_steps=False)))
+    else:
+        roots = get_roots()
+
+    files = None
+    if os.environ.get("FUTURECODER_TREE_SHAKE"):
+        files = sorted(tree_shaking.used_files(site_packages) | set(previous.get("files") or []))
+        if write_files:
+            print_tree_shaking_report(roots, files)
+
+    bundle_roots = split_roots(roots)
+    if write_files:
+        core_imports = "\n".join(roots)
+        core_imports_path = core_dir / "core_imports.txt"
+        if os.environ.get("FIX_CORE_IMPORTS"):
+            core_imports_path.write_text(core_imports)
+        elif core_imports_path.read_text() != core_imports:
+            raise ValueError(
+                f"core_imports.txt is out of date, run with FIX_CORE_IMPORTS=1.\n"
+                f"{core_imports}\n!=\n{core_imports_path.read_text()}"
+            )
 
-    with tarfile.open(frontend_src / "python_core.tar.load_by_url", "w") as tar:
-        tar.add(core_dir, arcname=core_dir.stem, recursive=True, filter=tarfile_filter)
+        # The packages only change along with `shared`, so they're kept in their own tar
+        # which is copied and then appended to.
+        build_cache_dir.mkdir(exist_ok=True)
+        if not (
+            previous
+            and previous["roots"] == roots
+            and previous.get("files") == files
+            and dependencies_tar_path.exists()
+            and all(path.exists() for path in bundle_paths())
+        ):
+            check_startup_imports(bundle_roots)
+            with tarfile.open(dependencies_tar_path, "w") as tar:
+                add_dependencies(tar, bundle_roots["core"], files)
+            bundles_dir.mkdir(exist_ok=True)
+            for name, path in zip(feature_bundles, bundle_paths()):
+                with tarfile.open(path, "w") as tar:
+                    add_dependencies(tar, bundle_roots[name], files)
+        tar_path = frontend_src / "python_core.tar.load_by_url"
+        shutil.copyfile(dependencies_tar_path, tar_path)
+        tar_args = dict(name=tar_path)
+    else:
+        fileobj = BytesIO()
+        for name in feature_bundles:
+            with tarfile.open(fileobj=BytesIO(), mode="w") as tar:
+                add_dependencies(tar, bundle_roots[name], files)
+        with tarfile.open(fileobj=fileobj, mode="w") as tar:
+            add_dependencies(tar, bundle_roots["core"], files)
+        fileobj.seek(0)
+        tar_args = dict(fileobj=fileobj)
+    with tarfile.open(mode="a", **tar_args) as tar:
+        add_files(tar, core_dir, core_dir.stem, third_party=False)
+        for path, data in [
+            (page_modules_path, page_modules()),
+            (step_records_path, step_records),
+            (bundles_path, {name: [root.removesuffix(".py") for root in bundle_roots[name]] for name in feature_bundles}),
+        ]:
+            add_json(tar, str(path.relative_to(core_dir.parent)), data)
         if t.current_language not in (None, "en"):
             for arcname in [
                 f"translations/locales/{t.current_language}/LC_MESSAGES",
                 f"translations/codes.json",
             ]:
                 tar.add(core_dir.parent / arcname, arcname=arcname, recursive=True, filter=tarfile_filter)
-            arcname = f"friendly_traceback/locales/{t.current_language}/LC_MESSAGES/friendly_tb_{t.current_language}.mo"
-            source_path = Path(site_packages) / arcname
-            if source_path.exists():
-                tar.add(source_path, arcname=arcname)
-
-        for root in roots:
-            tar.add(
-                Path(site_packages) / root,
-                arcname=root,
-                recursive=True,
-                filter=tarfile_filter,
-            )
-        for filename in ("__init__.py", "_mapping.py", "python.py"):
-            arcname = str("pygments/lexers/" + filename)
-            tar.add(Path(site_packages) / arcname, arcname=arcname)
+
+    if write_files:
+        json_to_file(
+            dict(
+                **fingerprints,
+                roots=roots,
+                files=files,
+                pages={slug: page["steps"] for slug, page in pages_json["pages"].items()},
+                step_records=step_records_by_page,
+            ),
+            build_cache_path,
+        )
 
     print("Done.")
+    return roots
+
+
+def watched_files_state():
+    result = []
+    for path in [core_dir, translations_dir, frontend_src / "english_terms.json"]:
+        files = [path] if path.is_file() else path.rglob("*")
+        for f in files:
+            if f.is_file() and "__pycache__" not in f.parts and f.name != "core_imports.txt":
+                stat = f.stat()
+                result.append((str(f), stat.st_mtime_ns, stat.st_size))
+    return sorted(result)
+
+
+def watch(interval=0.5):
+    """
+    Builds incrementally whenever the watched files change.
+    Each build runs in a new Python process so that all of core is imported fresh,
+    since this process has already imported it.
+    """
+    command = [sys.executable, "-m", "scripts.generate_static_files", "--incremental"]
+    state = None
+    while True:
+        new_state = watched_files_state()
+        if new_state != state:
+            state = new_state
+            start = time.perf_counter()
+            success = subprocess.run(command).returncode == 0
+            print(f"{'Built' if success else 'Failed'} in {time.perf_counter() - start:.2f}s, watching for changes...")
+        time.sleep(interval)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--incremental", action="store_true", help="Reuse the results of the last build where possible")
+    parser.add_argument("--watch", action="store_true", help="Build incrementally whenever files change")
+    args = parser.parse_args()
+    if args.watch:
+        watch()
+    else:
+        main(incremental=args.incremental)
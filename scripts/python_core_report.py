@@ -0,0 +1,107 @@
+"""
+Reports what python_core.tar.load_by_url (as generated by generate_static_files) contains
+and how long importing it takes, to see the effect of FUTURECODER_BYTECODE and FUTURECODER_DROP_SOURCES:
+
+    FUTURECODER_BYTECODE=1 python -m scripts.generate_static_files
+    python -m scripts.python_core_report
+
+Startup is measured by extracting the tar into a temporary directory and timing
+`core.init_pyodide.init` and importing `core.checker` in new Python processes
+which can only import from there and the standard library, like the worker.
+If the tar contains bytecode for all of its .py files, the same is measured
+without the bytecode, giving the difference that the bytecode makes.
+This runs in normal Python rather than Pyodide, where everything is several times slower,
+but the proportions should be similar.
+The feature bundles next to it aren't extracted, since they're only fetched when needed,
+but their sizes are shown.
+"""
+
+import argparse
+import importlib.util
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+default_path = Path(__file__).parent.parent / "frontend/src/python_core.tar.load_by_url"
+bundles_dir_name = "python_bundles"
+
+startup_code = """
+import time
+start = time.perf_counter()
+import core.init_pyodide
+core.init_pyodide.init("en")
+import core.checker
+print(time.perf_counter() - start)
+"""
+
+
+def member_sizes(members):
+    sizes = Counter()
+    for member in members:
+        if member.isfile():
+            kind = Path(member.name).suffix
+            sizes[kind if kind in (".py", ".pyc") else "other"] += member.size
+    return sizes
+
+
+def source_name(bytecode_name):
+    try:
+        return importlib.util.source_from_cache(bytecode_name)
+    except ValueError:
+        # Not in __pycache__, so there's no source
+        return None
+
+
+def startup_seconds(tar, members, repeats):
+    with tempfile.TemporaryDirectory() as directory:
+        tar.extractall(directory, members=members, filter="data")
+        times = []
+        for _ in range(repeats):
+            # -I -S: only the standard library and the extracted files can be imported.
+            # -B: don't write bytecode, since the files are extracted fresh each time in Pyodide.
+            output = subprocess.check_output(
+                [sys.executable, "-I", "-S", "-B", "-c", f"import sys; sys.path.insert(0, {directory!r})\n{startup_code}"],
+                cwd=directory,
+            )
+            times.append(float(output.decode().split()[-1]))
+        return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", default=default_path, type=Path)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    with tarfile.open(args.path) as tar:
+        members = tar.getmembers()
+        sizes = member_sizes(members)
+        print(f"{args.path.name}: {args.path.stat().st_size / 1e6:.1f} MB")
+        for kind in [".py", ".pyc", "other"]:
+            print(f"    {kind} files: {sizes[kind] / 1e6:.1f} MB")
+        for bundle_path in sorted((args.path.parent / bundles_dir_name).glob("*.tar.load_by_url")):
+            print(f"Bundle {bundle_path.name}: {bundle_path.stat().st_size / 1e6:.1f} MB")
+
+        seconds = startup_seconds(tar, members, args.repeats)
+        print(f"Startup: {seconds:.3f}s")
+
+        names = {member.name for member in members}
+        bytecode = [member for member in members if member.name.endswith(".pyc")]
+        has_all_sources = all(source_name(member.name) in names for member in bytecode)
+        if bytecode and has_all_sources:
+            without_bytecode = [member for member in members if not member.name.endswith(".pyc")]
+            size_without = sum(member_sizes(without_bytecode).values())
+            seconds_without = startup_seconds(tar, without_bytecode, args.repeats)
+            print(
+                f"Without bytecode: {size_without / 1e6:.1f} MB of files "
+                f"({(sum(sizes.values()) - size_without) / 1e6:+.1f} MB with bytecode), "
+                f"startup {seconds_without:.3f}s ({seconds - seconds_without:+.3f}s with bytecode)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Records which files of third party packages are actually used while generate_static_files runs the steps,
+so that with FUTURECODER_TREE_SHAKE=1 python_core.tar only contains those instead of whole packages.
+
+Modules are found in sys.modules, and other files (e.g. data files read by packages)
+with an audit hook on `open`, which is added when this module is imported,
+so it should be imported before any third party packages.
+
+Anything that isn't imported or opened while generating isn't shipped,
+e.g. a module that's only imported by code that no step reaches,
+so try the course properly after changing what's imported.
+"""
+
+import os
+import sys
+
+opened_files = set()
+
+
+def _audit_hook(event, args):
+    if event == "open" and isinstance(args[0], str):
+        opened_files.add(args[0])
+
+
+sys.addaudithook(_audit_hook)
+
+
+def used_files(site_packages):
+    """
+    Returns the paths relative to site_packages of all the files there
+    which have been imported or opened, apart from bytecode.
+    """
+    paths = set(opened_files)
+    for module in list(sys.modules.values()):
+        path = getattr(module, "__file__", None)
+        if isinstance(path, str):
+            paths.add(path)
+
+    result = set()
+    for path in paths:
+        path = os.path.abspath(path)
+        if path.startswith(site_packages) and "__pycache__" not in path and os.path.isfile(path):
+            result.add(path[len(site_packages):])
+    return result
@@ -0,0 +1,65 @@
+"""
+Compares the cost of passing the result of check_entry to JavaScript
+by converting it with `to_js` against serializing it to JSON (check_entry_json)
+and parsing that with `JSON.parse`.
+
+The comparison only means something inside Pyodide, where the `js` module exists,
+e.g. by copying this file into the worker's filesystem and running `main()` there.
+In normal Python only the cost of `json.dumps` is measured.
+
+Traceback data is sent in output parts rather than the result,
+so the traceback case only measures the text of the traceback in `output`.
+
+Run with `python -m tests.benchmark_result_conversion`.
+"""
+
+import json
+import timeit
+
+from core.checker import check_entry, FullRunner, result_schema_version
+from core.text import load_chapters, step_test_entries
+
+programs = dict(
+    long_output="for i in range(20000):\n    print(i, [i] * 3)",
+    traceback="def f(n):\n" + "".join(f"    v{i} = list(range({i}))\n" for i in range(100)) + "    return 1 / 0\nf(0)",
+    birdseye="def f(n):\n    return n and f(n - 1) + 1\nfor i in range(30):\n    f(i)",
+)
+
+
+def results():
+    list(load_chapters())
+    _, _, _, entry = next(step_test_entries())
+    for name, program in programs.items():
+        source = "birdseye" if name == "birdseye" else "editor"
+        runner = FullRunner(filename="/my_program.py")
+        result = check_entry(dict(entry, input=program, source=source), lambda *_: None, runner)
+        if source == "birdseye" and not result["birdseye_objects"]:
+            print(f"{name}: skipped, needs futurecoder's fork of birdseye")
+            continue
+        yield name, result
+
+
+def main():
+    try:
+        import js
+        from pyodide.ffi import to_js
+    except ImportError:
+        js = to_js = None
+
+    for name, result in results():
+        payload = dict(schema_version=result_schema_version, result=result)
+        size = len(json.dumps(payload))
+        timings = dict(json=lambda: json.dumps(payload, default=str))
+        if js:
+            timings["json_and_parse"] = lambda: js.JSON.parse(json.dumps(payload, default=str))
+            timings["to_js"] = lambda: to_js(result, dict_converter=js.Object.fromEntries)
+
+        print(f"{name}: {size} characters of JSON")
+        for method, func in timings.items():
+            number = 5
+            seconds = min(timeit.repeat(func, number=number, repeat=3)) / number
+            print(f"    {method}: {seconds * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
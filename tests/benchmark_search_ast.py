@@ -0,0 +1,36 @@
+"""
+Compares checking the Disallowed rules of the course with one `search_ast` call per rule
+against a single `TemplateMatcher` walk.
+
+Run with `python -m tests.benchmark_search_ast`.
+"""
+
+import timeit
+
+from core.text import TemplateMatcher, search_ast
+from tests.test_search_ast import course_trees_and_rules
+
+
+def main():
+    trees, rules = course_trees_and_rules()
+    print(f"{len(trees)} trees, {len(rules)} rules")
+
+    def with_search_ast():
+        for tree in trees:
+            for template, predicate in rules:
+                search_ast(tree, template, predicate or (lambda n: True))
+
+    def with_matcher():
+        # Includes compiling the templates, which normally happens once per step class
+        matcher = TemplateMatcher(dict(enumerate(rules)))
+        for tree in trees:
+            matcher.counts(tree)
+
+    for func in [with_search_ast, with_matcher]:
+        number = 3
+        seconds = min(timeit.repeat(func, number=number, repeat=3)) / number
+        print(f"{func.__name__}: {seconds * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Measures how long check_entry takes for every entry in step_test_entries,
+i.e. the same programs as test_steps.
+
+Steps are loaded the way the worker loads them (see core/init_pyodide.py):
+step records and page modules are first generated in a separate process as in a build,
+then loaded here, so that pages are imported lazily and steps are cleaned from their records.
+
+For each entry, the first check is the cold latency and the median of the others is the warm latency.
+The cold latency of the first entry of each step also includes getting the step from its page,
+i.e. cleaning the step class from its record and importing the chapter if it's the first page in it.
+Loading the records themselves is timed once as `startup`.
+The language is taken from FUTURECODER_LANGUAGE as in test_steps.
+
+    python -m tests.benchmark_steps                          # print the slowest entries
+    python -m tests.benchmark_steps --save baseline.json     # write a baseline
+    python -m tests.benchmark_steps --compare baseline.json  # report entries slower than the baseline
+
+Timings depend on the machine, so only compare against a baseline saved on the same machine,
+and don't commit baselines.
+Entries can also be run with other code sources, e.g. `--sources snoop birdseye`,
+in addition to their own source. Only entries with multiline programs are run in other sources.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from littleutils import file_to_json
+
+import core.utils
+from core import translation as t
+from core.checker import check_entry, FullRunner
+from core.text import (
+    get_step_records,
+    load_chapters,
+    page_modules,
+    pages,
+    step_records,
+    step_test_entries,
+)
+from core.utils import make_test_input_callback
+
+
+def entry_key(step, substep, source):
+    name = f"{step.page.slug}.{step.__name__}"
+    if substep is not step:
+        name += f".{substep.__name__}"
+    return f"{name}:{source}"
+
+
+def build_records(directory):
+    """
+    Writes the step records and page modules like scripts/generate_static_files.py.
+    This imports every chapter, so it runs in a separate process.
+    """
+    list(load_chapters())
+    (directory / "step_records.json").write_text(json.dumps(get_step_records()))
+    (directory / "page_modules.json").write_text(json.dumps(page_modules()))
+
+
+def load_records(directory):
+    """
+    Loads the output of build_records like core.init_pyodide.init,
+    returning how long that took.
+    """
+    assert not pages
+    start = time.perf_counter()
+    step_records.update(file_to_json(directory / "step_records.json"))
+    pages.modules = file_to_json(directory / "page_modules.json")
+    return time.perf_counter() - start
+
+
+def measure(repeats, sources):
+    runner = FullRunner(filename="/my_program.py")
+    results = {}
+    counted = set()
+    step_times = {}
+
+    for page, step, substep, entry in step_test_entries_timing_steps(step_times):
+        entry_sources = [entry["source"]]
+        if "\n" in entry["input"]:
+            entry_sources += [source for source in sources if source != entry["source"]]
+
+        for source in entry_sources:
+            times = []
+            for _ in range(repeats):
+                input_callback = make_test_input_callback(step.stdin_input)
+
+                def callback(event_type, data):
+                    if event_type == "input":
+                        return input_callback(data)
+
+                step.pre_run(runner)
+                start = time.perf_counter()
+                check_entry(dict(entry, source=source), callback, runner)
+                times.append(time.perf_counter() - start)
+
+            result = dict(warm=round(statistics.median(times[1:] or times), 5))
+            if step not in counted:
+                counted.add(step)
+                result["get_step"] = round(step_times[step], 5)
+                times[0] += step_times[step]
+            result["cold"] = round(times[0], 5)
+            results[entry_key(step, substep, source)] = result
+
+    return results
+
+
+def step_test_entries_timing_steps(step_times):
+    """
+    step_test_entries for the pages in `pages.modules`, importing them one at a time,
+    and recording how long getting each step from its page took in `step_times`.
+    Steps are cleaned by `page.get_step` just before their first entry is yielded.
+    """
+    for slug in list(pages.modules):
+        start = time.perf_counter()
+        pages[slug]  # noqa
+        for page, step, substep, entry in step_test_entries({slug}):
+            step_times.setdefault(step, time.perf_counter() - start)
+            yield page, step, substep, entry
+            start = time.perf_counter()
+
+
+def compare(results, baseline, threshold, min_seconds):
+    regressions = []
+    for key, result in results.items():
+        old = baseline.get(key)
+        if not old:
+            continue
+        for field in ["cold", "warm"]:
+            if field in result and result[field] > old[field] * threshold and result[field] - old[field] > min_seconds:
+                regressions.append((key, field, old[field], result[field]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--sources", nargs="*", default=[], choices=["editor", "snoop", "birdseye"])
+    parser.add_argument("--save", metavar="PATH", help="Write the results to this file")
+    parser.add_argument("--compare", metavar="PATH", help="Compare the results to a file written by --save")
+    parser.add_argument("--threshold", type=float, default=1.5,
+                        help="Ratio to the baseline above which an entry counts as slower")
+    parser.add_argument("--min-seconds", type=float, default=0.02,
+                        help="Differences from the baseline smaller than this are ignored")
+    parser.add_argument("--build-records", metavar="DIRECTORY", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    core.utils.TESTING = True
+    random.seed(0)
+    t.set_language(os.environ.get("FUTURECODER_LANGUAGE", "en"))
+
+    if args.build_records:
+        build_records(Path(args.build_records))
+        return
+
+    with TemporaryDirectory() as directory:
+        subprocess.run(
+            [sys.executable, "-m", "tests.benchmark_steps", "--build-records", directory],
+            check=True,
+        )
+        startup = load_records(Path(directory))
+
+    results = measure(args.repeats, args.sources)
+    results["startup"] = dict(cold=round(startup, 5))
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=4, sort_keys=True))
+
+    if args.compare:
+        regressions = compare(results, file_to_json(args.compare), args.threshold, args.min_seconds)
+        for key, field, old, new in regressions:
+            print(f"{key} {field}: {old:.3f}s -> {new:.3f}s")
+        print(f"{len(regressions)} regressions in {len(results)} entries")
+        if regressions:
+            sys.exit(1)
+    else:
+        for key, result in sorted(results.items(), key=lambda item: -item[1]["cold"])[:20]:
+            print(f"{key}: {result}")
+
+
+if __name__ == "__main__":
+    main()
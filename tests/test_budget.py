@@ -0,0 +1,78 @@
+import sys
+
+import pytest
+
+from core import translation as t
+from core import checker
+from core.checker import check_entry, FullRunner
+from core.exercises import check_result, make_function
+from core.runner.budget import execution_budget, user_code
+from core.submission import Submission
+from core.text import load_chapters, step_test_entries
+
+requires_monitoring = pytest.mark.skipif(not hasattr(sys, "monitoring"), reason="requires sys.monitoring")
+
+
+@requires_monitoring
+def test_check_result_budget():
+    _, func = make_function(Submission("x = 1\nwhile x:\n    x += 1", "/my_program.py"), ["x"])
+    with user_code("/my_program.py"), execution_budget(1000):
+        test_result, result = check_result(func, dict(x=1), "")
+    assert result == t.Terms.code_took_too_long
+    assert not test_result["passed"]
+
+    _, func = make_function(Submission("x = 3\nprint(x)", "/my_program.py"), ["x"])
+    with user_code("/my_program.py"), execution_budget(1000):
+        test_result, result = check_result(func, dict(x=3), None)
+    assert test_result["passed"]
+
+
+@requires_monitoring
+def test_only_user_code_counts():
+    # e.g. code generated by namedtuple and dataclasses with exec
+    other_code = compile("for i in range(10000):\n    pass", "<string>", "exec")
+    with user_code("/my_program.py"), execution_budget(1000):
+        exec(other_code, {})
+
+
+def test_may_run_long():
+    for source in ["x = 1\nprint(x + 2)", "print(sum(range(10)))", "1 +"]:
+        assert not Submission(source).may_run_long
+    for source in ["while True:\n    pass", "def f():\n    f()", "[i for i in range(3)]", "f = lambda: f()"]:
+        assert Submission(source).may_run_long
+
+
+def test_check_entry_budget(monkeypatch):
+    """
+    The code is stopped where there's sys.monitoring and runs to the end elsewhere,
+    but either way check_entry gives it the step's budget.
+    """
+    list(load_chapters())
+    _, step, _, entry = next(step_test_entries())
+    monkeypatch.setattr(step, "execution_budget", 1000)
+    budgets = []
+    monkeypatch.setattr(checker, "execution_budget", lambda budget: budgets.append(budget) or execution_budget(budget))
+    outputs = []
+
+    def callback(event_type, data):
+        if event_type == "output":
+            outputs.extend(part["text"] for part in data["parts"])
+
+    def check(program):
+        outputs.clear()
+        budgets.clear()
+        return check_entry(dict(entry, input=program, source="editor"), callback, FullRunner(filename="/my_program.py"))
+
+    result = check("print('start')\ndef f(n):\n    return n and f(n - 1) + f(n - 1)\nf(12)\nprint('end')")
+    assert budgets == [1000]
+    assert not result["passed"]
+    if hasattr(sys, "monitoring"):
+        assert "took too long" in result["message_sections"][0]["messages"][0]
+        assert outputs == ["start\n"]
+    else:
+        assert "".join(outputs) == "start\nend\n"
+
+    # Code without loops or functions can't keep running, so it has no budget
+    check("print('start')\nprint(sum(range(100)))")
+    assert budgets == [None]
+    assert "".join(outputs) == "start\n4950\n"
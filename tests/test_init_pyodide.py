@@ -0,0 +1,71 @@
+import importlib
+import sys
+import tarfile
+from io import BytesIO
+
+import pytest
+
+from core import init_pyodide
+from core.init_pyodide import BundleFinder
+
+
+def make_bundle(files):
+    fileobj = BytesIO()
+    with tarfile.open(fileobj=fileobj, mode="w") as tar:
+        for name, content in files.items():
+            tar_info = tarfile.TarInfo(name)
+            tar_info.size = len(content)
+            tar.addfile(tar_info, BytesIO(content))
+    return fileobj.getvalue()
+
+
+def test_bundle_finder(tmp_path, monkeypatch):
+    bundles = {
+        "url_one": make_bundle({
+            "bundled_package/__init__.py": b"from bundled_module import x",
+            "bundled_module.py": b"x = 1",
+        }),
+    }
+    fetched = []
+
+    def fetch_bytes(url):
+        fetched.append(url)
+        return bundles[url]
+
+    monkeypatch.setattr(init_pyodide, "fetch_bytes", fetch_bytes)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    finder = BundleFinder(
+        dict(one="url_one", two="url_two"),
+        dict(one=["bundled_package", "bundled_module"], two=["missing_bundle_module"]),
+        tmp_path,
+    )
+    monkeypatch.setattr(sys, "meta_path", [finder, *sys.meta_path])
+    for name in ["bundled_package", "bundled_module"]:
+        monkeypatch.delitem(sys.modules, name, raising=False)
+
+    searched = []
+    find_spec = finder.find_spec
+    monkeypatch.setattr(finder, "find_spec", lambda name, *args: searched.append(name) or find_spec(name, *args))
+
+    # Modules that aren't in a bundle are left to the other finders
+    assert finder.find_spec("json") is None
+    assert fetched == []
+
+    # The module only exists in the bundle, so importing it goes through the finder,
+    # which fetches the bundle once
+    assert not (tmp_path / "bundled_module.py").exists()
+    searched.clear()
+    assert importlib.import_module("bundled_module").x == 1
+    assert searched[0] == "bundled_module"  # tarfile may import e.g. gzip while extracting
+    assert fetched == ["url_one"]
+    assert (tmp_path / "bundled_module.py").exists()
+
+    # The bundle's other modules are already there
+    assert importlib.import_module("bundled_package").x == 1
+    assert fetched == ["url_one"]
+
+    # A bundle that fails to load is tried again next time
+    for _ in range(2):
+        with pytest.raises(ImportError, match="Failed to load the two bundle"):
+            importlib.import_module("missing_bundle_module")
+    assert fetched == ["url_one", "url_two", "url_two"]
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+import core.checker
+import core.utils
+from core import translation as t
+from core.checker import check_entry, check_entry_json, FullRunner, OutputCollector, result_schema_version
+from core.text import load_chapters, step_test_entries
+
+
+def test_output_truncated():
+    list(load_chapters())
+    _, _, _, entry = next(step_test_entries())
+    batches = []
+
+    def callback(event_type, data):
+        if event_type == "output":
+            batches.append(data["parts"])
+
+    entry = dict(entry, input="for i in range(100000):\n    print(i)\n1 / 0", source="editor")
+    result = check_entry(entry, callback, FullRunner(filename="/my_program.py"))
+
+    marker = t.Terms.output_truncated.format(max_length=OutputCollector.max_length)
+    parts = [part for batch in batches for part in batch]
+    assert "".join(part["text"] for part in parts) == result["output"]
+    assert result["output"].startswith("0\n1\n2\n")
+    assert parts[-2]["text"] == "\n" + marker + "\n"
+    assert parts[-1]["type"] == "traceback"
+    assert sum(len(part["text"]) for part in parts[:-1]) == OutputCollector.max_length + len(marker) + 2
+    assert result["output_stats"]["truncated"]
+    assert result["output_stats"]["length"] == len("".join(f"{i}\n" for i in range(100000)))
+    assert len(batches) < result["output_stats"]["parts"]
+
+
+def test_check_entry_json():
+    list(load_chapters())
+    _, _, _, entry = next(step_test_entries())
+    entry = dict(entry, input="print('<b>')\nx = [1]\nx + 'a'", source="editor")
+    result = check_entry(entry, lambda *_: None, FullRunner(filename="/my_program.py"))
+    result_json = check_entry_json(entry, lambda *_: None, FullRunner(filename="/my_program.py"))
+    loaded = json.loads(result_json)
+    assert loaded["schema_version"] == result_schema_version
+    assert loaded["result"] == json.loads(json.dumps(result))
+
+
+def test_check_entry_json_non_finite_floats(monkeypatch):
+    def check_entry(*_):
+        return dict(timings=dict(run=float("nan")), values=[float("inf"), -float("inf"), 1.5])
+
+    monkeypatch.setattr(core.checker, "check_entry", check_entry)
+    result_json = check_entry_json({}, lambda *_: None)
+    # JSON.parse doesn't accept NaN or Infinity, so parse_constant is never needed
+    assert json.loads(result_json, parse_constant=pytest.fail)["result"] == dict(
+        timings=dict(run="nan"),
+        values=["inf", "-inf", 1.5],
+    )
+
+
+def test_check_entry_json_internal_error(monkeypatch):
+    monkeypatch.setattr(core.utils, "TESTING", False)
+    entry = dict(input="1", source="shell", page_slug="NoSuchPage", step_name="no_such_step")
+    result_json = check_entry_json(entry, lambda *_: None, FullRunner(filename="/my_program.py"))
+    error = json.loads(result_json)["result"]["error"]
+    assert "NoSuchPage" in error["title"]
+    assert error["sentry_event"]["exception"]
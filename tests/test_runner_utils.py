@@ -0,0 +1,22 @@
+import ast
+import keyword
+
+from core.runner.utils import is_valid_syntax
+
+
+def parses(text):
+    try:
+        ast.parse(text)
+        return True
+    except Exception:
+        return False
+
+
+def test_is_valid_syntax():
+    cases = [
+        "word", "i", "board[0]", "[1, 2, ...]", "<function f at 0x1>", "\n<x", "# comment\n<x",
+        " x", ") ", "}", "", "   ", "a b", "1 +", "x\n", "a\x00", "ñ",
+        *keyword.kwlist, *keyword.softkwlist,
+    ]
+    for text in cases:
+        assert is_valid_syntax(text) == parses(text), text
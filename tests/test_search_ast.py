@@ -0,0 +1,41 @@
+import ast
+
+from astcheck import listmiddle, name_or_attr
+
+from core.text import TemplateMatcher, load_chapters, search_ast, step_test_entries
+
+extra_rules = [
+    (ast.Call(func=ast.Name(id="max")), None),
+    (ast.Call(func=ast.Attribute(attr="insert"), args=[ast.Constant(value=2), ast.Constant(value=9)]), None),
+    (ast.BinOp(left=ast.Str(), op=ast.Add(), right=ast.Str()), None),
+    (ast.Subscript(value=ast.Subscript()), None),
+    ((ast.Mult, ast.Add, ast.Num), None),
+    (ast.Name, lambda node: node.id == "print"),
+    (ast.Call(func=name_or_attr("append")), None),
+    (ast.For(body=listmiddle() + [ast.Expr()]), None),
+    (ast.parse("print(x[-2][-1])").body[0], None),
+]
+
+
+def course_trees_and_rules():
+    list(load_chapters())
+    trees = []
+    rules = list(extra_rules)
+    for _, step, substep, entry in step_test_entries():
+        try:
+            trees.append(ast.parse(entry["input"]))
+        except SyntaxError:
+            pass
+        for d in getattr(substep, "disallowed", []):
+            rules.append((d.template, d.predicate))
+    return trees, rules
+
+
+def test_template_matcher():
+    trees, rules = course_trees_and_rules()
+    matcher = TemplateMatcher(dict(enumerate(rules)))
+    for tree in trees:
+        counts = matcher.counts(tree)
+        for i, (template, predicate) in enumerate(rules):
+            expected = search_ast(tree, template, predicate or (lambda n: True))
+            assert counts[i] == expected, (ast.unparse(tree), template)
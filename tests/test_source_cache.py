@@ -0,0 +1,50 @@
+import linecache
+
+import executing
+import stack_data
+
+from core.checker import FullRunner
+from core.runner import source_cache
+
+
+def run(runner, filename, program):
+    runner.set_filename(filename)
+    runner.run(program)
+
+
+def test_caches_stay_bounded(tmp_path):
+    runner = FullRunner(filename=str(tmp_path / "my_program.py"))
+    runner.set_callback(lambda *_: None)
+    filenames = [str(tmp_path / f"my_program_{i}.py") for i in range(3 * source_cache.max_sources)]
+    for i, filename in enumerate(filenames):
+        run(runner, filename, f"def f():\n    return 1 / {i % 2}\nx = f() + {i}")
+
+    filenames = set(filenames)
+    assert len(filenames & set(linecache.cache)) == source_cache.max_sources
+    assert {str(path) for path in tmp_path.glob("my_program_*.py")} == filenames & set(linecache.cache)
+    for cls in [stack_data.Source, executing.Source]:
+        source_filenames = {filename for filename, _ in cls._class_local("__source_cache_with_lines", {})}
+        assert len(source_filenames & filenames) <= source_cache.max_sources
+        code_filenames = {key[0].co_filename for key in cls._class_local("__executing_cache", {})}
+        assert len(code_filenames & filenames) <= source_cache.max_sources
+
+    rerun_prefix = str(tmp_path / "my_rerun_")
+    for i in range(2 * source_cache.max_filenames_per_source):
+        run(runner, f"{rerun_prefix}{i}.py", "1 / 0")
+    assert sum(filename.startswith(rerun_prefix) for filename in linecache.cache) == source_cache.max_filenames_per_source
+    assert len(list(tmp_path.glob("my_rerun_*.py"))) == source_cache.max_filenames_per_source
+
+
+def test_rerun_reuses_source(tmp_path):
+    runner = FullRunner(filename=str(tmp_path / "my_program.py"))
+    runner.set_callback(lambda *_: None)
+    program = "def g(x):\n    return x.missing\ng(3)"
+    filename_a = str(tmp_path / "my_program_a.py")
+    filename_b = str(tmp_path / "my_program_b.py")
+    run(runner, filename_a, program)
+    run(runner, filename_b, program)
+    source_a = stack_data.Source.for_filename(filename_a)
+    source_b = stack_data.Source.for_filename(filename_b)
+    assert source_a is not source_b
+    assert source_b.filename == filename_b
+    assert source_a.tree is source_b.tree
@@ -1,69 +1,71 @@
 import json
+import multiprocessing
 import os
 import random
 import re
+import sys
+import types
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import core.utils
 from core import translation as t
-from core.checker import check_entry, FullRunner
-from core.text import step_test_entries, get_predictions, load_chapters
+from core.checker import check_entry, explain_traceback, FullRunner
+from core.exercises import deserialize_test_value, serialize_test_value
+from core.text import (
+    ExerciseStep,
+    get_predictions,
+    get_step_records,
+    iter_step_names,
+    load_chapters,
+    page_modules,
+    pages,
+    step_record,
+    step_records,
+    step_test_entries,
+)
 from core.utils import highlighted_markdown, make_test_input_callback
 
 core.utils.TESTING = True
 
-random.seed(0)
+# The filename of the programs in the transcript
+transcript_filename = "/my_program.py"
 
 
 def test_steps():
     lang = os.environ.get("FUTURECODER_LANGUAGE", "en")
+    num_workers = int(os.environ.get("FUTURECODER_TEST_WORKERS", 0)) or os.cpu_count() or 1
+    check_transcript(lang, num_workers)
+
+
+def check_transcript(lang, num_workers):
+    """
+    Compares the transcript of all the step test entries to the golden file,
+    or updates the file if FIX_TESTS is set.
+    """
     t.set_language(lang)
     list(load_chapters())
-    runner = FullRunner(filename="/my_program.py")
-    transcript = []
-    for page, step, substep, entry in step_test_entries():
-        program = substep.program
-        is_message = substep != step
-
-        output_parts = []
-        input_callback = make_test_input_callback(step.stdin_input)
-
-        def callback(event_type, data):
-            if event_type == "input":
-                return input_callback(data)
-            elif event_type == "output":
-                output_parts.extend(data["parts"])
-
-        step.pre_run(runner)
-
-        response = check_entry(entry, callback, runner)
-        response["output_parts"] = output_parts
-        normalise_response(response, is_message, substep)
-
-        transcript_item = dict(
-            program=program.splitlines(),
-            page=page.title,
-            step=step.__name__,
-            response=response,
-        )
-        transcript.append(transcript_item)
-
-        if step.get_solution and not is_message:
-            get_solution = "".join(step.get_solution["tokens"])
-            assert "def solution(" not in get_solution
-            assert "returns_stdout" not in get_solution
-            assert get_solution.strip() in program
-            if get_solution == program:
-                transcript_item["get_solution"] = "program"
-            else:
-                transcript_item["get_solution"] = get_solution.splitlines()
-                if step.parsons_solution:
-                    is_function = transcript_item["get_solution"][0].startswith(
-                        "def "
-                    )
-                    assert len(step.get_solution["lines"]) >= 4 + is_function
-
-        assert response["passed"] == (not is_message), step
+    page_slugs = list(pages)
+
+    # Pages are checked independently (each with a new runner and seeds derived from the step)
+    # so the transcript is the same however they're divided among processes.
+    shards = [page_slugs[i::num_workers] for i in range(num_workers)]
+    shards = [shard for shard in shards if shard]
+    if len(shards) > 1:
+        # The runner writes the program to its filename when it can,
+        # and the source is read back from there, so processes mustn't share a filename.
+        # These directories don't exist, so nothing is written.
+        filenames = [f"/test{i:03}/my.py" for i in range(len(shards))]
+        with ProcessPoolExecutor(len(shards)) as executor:
+            shard_transcripts = list(executor.map(page_transcripts, [lang] * len(shards), shards, filenames))
+    else:
+        shard_transcripts = [page_transcripts(lang, page_slugs)]
+
+    transcripts_by_page = {}
+    for shard_transcript in shard_transcripts:
+        transcripts_by_page.update(shard_transcript)
+    transcript = [item for slug in page_slugs for item in transcripts_by_page.get(slug, [])]
 
     dirpath = Path(__file__).parent / "golden_files" / lang
     dirpath.mkdir(parents=True, exist_ok=True)
@@ -75,21 +77,110 @@ def test_steps():
         assert transcript == json.loads(path.read_text())
 
 
-def normalise_output(s):
+def page_transcripts(lang, page_slugs, filename=transcript_filename):
+    """
+    Returns {page_slug: [transcript items]} for the given pages, in the order of step_test_entries,
+    running the programs with the given filename, which is shown as transcript_filename.
+    """
+    # Output is split into parts by length, so the filename must not change the length
+    assert len(filename) == len(transcript_filename)
+    t.set_language(lang)
+    list(load_chapters())
+    page_slugs = set(page_slugs)
+
+    result = {}
+    runner = None
+    for page, step, substep, entry in step_test_entries(page_slugs):
+        if page.slug not in result:
+            result[page.slug] = []
+            runner = FullRunner(filename=filename)
+        random.seed(f"{page.slug}.{step.__name__}.{substep.__name__}")
+        result[page.slug].append(transcript_item(runner, page, step, substep, entry))
+    return result
+
+
+def transcript_item(runner, page, step, substep, entry):
+    program = substep.program
+    is_message = substep != step
+
+    output_parts = []
+    input_callback = make_test_input_callback(step.stdin_input)
+
+    def callback(event_type, data):
+        if event_type == "input":
+            value = input_callback(data)
+            # Show the value in the transcript the same way as add_stdin_input_arg.
+            # This isn't output of the program, so it mustn't be in the run's stdout.
+            output_parts.append(dict(type="stdout", text=f"<input: {value}>\n"))
+            return value
+        elif event_type == "output":
+            output_parts.extend(data["parts"])
+
+    step.pre_run(runner)
+
+    response = check_entry(entry, callback, runner)
+    response["output_parts"] = output_parts
+    normalise_response(response, is_message, substep, runner.filename)
+
+    item = dict(
+        program=program.splitlines(),
+        page=page.title,
+        step=step.__name__,
+        response=response,
+    )
+
+    if step.get_solution and not is_message:
+        get_solution = "".join(step.get_solution["tokens"])
+        assert "def solution(" not in get_solution
+        assert "returns_stdout" not in get_solution
+        assert get_solution.strip() in program
+        if get_solution == program:
+            item["get_solution"] = "program"
+        else:
+            item["get_solution"] = get_solution.splitlines()
+            if step.parsons_solution:
+                is_function = item["get_solution"][0].startswith(
+                    "def "
+                )
+                assert len(step.get_solution["lines"]) >= 4 + is_function
+
+    assert response["passed"] == (not is_message), step
+    return item
+
+
+def normalise_output(s, filename=transcript_filename):
     s = re.sub(r" at 0x\w+>", " at 0xABC>", s)
+    s = s.replace(filename, transcript_filename)
     return s
 
 
-def normalise_response(response, is_message, substep):
+def normalise_filenames(value, filename):
+    """
+    Replaces the runner's filename with transcript_filename in all the strings in a traceback's data.
+    """
+    if isinstance(value, str):
+        return value.replace(filename, transcript_filename)
+    elif isinstance(value, list):
+        return [normalise_filenames(item, filename) for item in value]
+    elif isinstance(value, dict):
+        return {key: normalise_filenames(item, filename) for key, item in value.items()}
+    return value
+
+
+def normalise_response(response, is_message, substep, filename=transcript_filename):
     response["result"] = response.pop("output_parts")
     for line in response["result"]:
-        line["text"] = normalise_output(line["text"])
+        line["text"] = normalise_output(line["text"], filename)
         if line["type"] == "traceback":
             line["text"] = line["text"].splitlines()
+            for traceback in line["data"]:
+                traceback.update(explain_traceback(traceback.pop("explanation")))
+            line["data"] = normalise_filenames(line["data"], filename)
 
     response.pop("birdseye_objects", None)
     del response["error"]
     del response["output"]
+    del response["output_stats"]
 
     response["prediction"] = get_predictions(substep)
     if not response["prediction"]["choices"]:
@@ -113,3 +204,91 @@ def normalise_response(response, is_message, substep):
             assert expected == message
         else:
             assert expected in message
+
+
+def test_step_records_round_trip(tmp_path, monkeypatch):
+    """
+    The worker imports chapters lazily using page_modules.json
+    and loads steps from step_records.json (see core.init_pyodide)
+    instead of translating and verifying them like the other tests,
+    so check that both ways give the same transcript.
+    """
+    lang = os.environ.get("FUTURECODER_LANGUAGE", "en")
+    # Each needs a fresh process, since steps are only cleaned once.
+    # The runner replaces __main__ with the module of the user's code, which the new processes would run.
+    monkeypatch.setitem(sys.modules, "__main__", types.ModuleType("__main__"))
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn"), max_tasks_per_child=1) as executor:
+        built = executor.submit(built_transcripts, lang, tmp_path).result()
+        loaded = executor.submit(loaded_transcripts, lang, tmp_path).result()
+
+    # get_solution is only generated at build time for the frontend
+    for items in built.values():
+        for item in items:
+            item.pop("get_solution", None)
+    assert loaded == built
+
+
+def built_transcripts(lang, directory):
+    t.set_language(lang)
+    list(load_chapters())
+    (directory / "step_records.json").write_text(json.dumps(get_step_records()))
+    (directory / "page_modules.json").write_text(json.dumps(page_modules()))
+    return page_transcripts(lang, list(pages))
+
+
+def loaded_transcripts(lang, directory):
+    t.set_language(lang)
+    step_records.update(json.loads((directory / "step_records.json").read_text()))
+    pages.modules = json.loads((directory / "page_modules.json").read_text())
+    assert not pages
+    for slug in pages.modules:
+        assert pages[slug].slug == slug
+    assert list(pages) == list(pages.modules)
+    return page_transcripts(lang, list(pages))
+
+
+def exercise_step_classes():
+    list(load_chapters())
+    for page, step_name in iter_step_names(final_text=False):
+        step = page.get_step(step_name)
+        # The same classes as get_step_records
+        for cls in [step, *[message_cls.__bases__[0] for message_cls in step.messages]]:
+            if issubclass(cls, ExerciseStep):
+                yield cls
+
+
+def test_serialized_test_values():
+    """
+    Test values are serialized at build time (see step_record),
+    and must give the same values as generating them with SeededRandom.
+    """
+    num_serialized = 0
+    for cls in exercise_step_classes():
+        serialized = cls.serialize_test_values()
+        if serialized is None:
+            continue
+        num_serialized += 1
+        generated = list(cls.generate_test_values())
+        deserialized = [deserialize_test_value(test_value) for test_value in serialized]
+        assert deserialized == generated, cls
+        assert list(map(repr, deserialized)) == list(map(repr, generated)), cls
+    assert num_serialized > 50
+
+
+def test_unserializable_test_values(monkeypatch):
+    """
+    Test values which don't survive repr and literal_eval are generated at runtime instead.
+    """
+    for value in [object(), float("nan"), {1: object()}, defaultdict(list)]:
+        assert serialize_test_value(({"x": value}, "result")) is None
+    assert serialize_test_value(({"x": [1, "2", {3: (4.5, None)}]}, "result"))
+
+    cls = next(exercise_step_classes())
+    test_values = list(cls.generate_test_values())
+    assert step_record(cls)["test_values"]
+    monkeypatch.setattr(
+        cls,
+        "generate_test_values",
+        classmethod(lambda _cls: iter([*test_values, ({"x": object()}, "result")])),
+    )
+    assert step_record(cls)["test_values"] is None
@@ -0,0 +1,181 @@
+import pytest
+
+from core import translation as t
+from core.checker import check_entry, FullRunner
+from core.submission import Submission
+from core.text import load_chapters, pages, VerbatimStep
+from core.utils import add_stdin_input_arg, returns_stdout
+
+
+def test_memoize():
+    submission = Submission("x = 1")
+    calls = []
+
+    def func(**inputs):
+        calls.append(inputs)
+        if inputs["x"] < 0:
+            raise ValueError(inputs["x"])
+        return [inputs["x"]]
+
+    memoized = submission.memoize(func, "key")
+    result = memoized(x=1)
+    assert result == [1]
+    assert memoized(x=1) is result
+    assert calls == [dict(x=1)]
+
+    # Other functions memoized with the same key share results, other keys don't
+    assert submission.memoize(func, "key")(x=1) is result
+    assert submission.memoize(func, "other key")(x=1) == [1]
+    assert memoized(x=2) == [2]
+    assert calls == [dict(x=1), dict(x=1), dict(x=2)]
+
+    # Exceptions are raised again without calling the function
+    with pytest.raises(ValueError) as first:
+        memoized(x=-1)
+    with pytest.raises(ValueError) as second:
+        memoized(x=-1)
+    assert first.value is second.value
+    assert calls == [dict(x=1), dict(x=1), dict(x=2), dict(x=-1)]
+
+    # Known results aren't calculated at all
+    submission.add_evaluation("key", dict(x=3), "known")
+    assert memoized(x=3) == "known"
+    assert len(calls) == 4
+
+
+def run_entry(step, program, input_values):
+    """
+    Returns the Submission of running the program for the step in the editor,
+    entering the given input values, and the timings counters of the check.
+    """
+    input_values = iter(input_values)
+
+    def callback(event_type, _data):
+        if event_type == "input":
+            return next(input_values)
+
+    entry = dict(
+        input=program,
+        source="editor",
+        page_slug=step.page.slug,
+        step_name=step.__name__,
+        timings=True,
+    )
+    runner = FullRunner(filename="/my_program.py")
+    result = check_entry(entry, callback, runner)
+    return runner.submission, result
+
+
+def rerun_output(program, stdin_input):
+    def func():
+        exec(program, {})
+
+    return returns_stdout(add_stdin_input_arg(func))(stdin_input=stdin_input)
+
+
+@pytest.mark.parametrize("program", [
+    'name = input("Name: ")\nprint("Hi " + name)',
+    'name = input()\nprint("Hi " + name)',
+])
+def test_run_output_matches_rerun(program):
+    list(load_chapters())
+    step = pages["InteractiveProgramsWithInput"].get_step("convert_input_to_int")
+    submission, _ = run_entry(step, program, ["Bob"])
+    assert submission.run_output == (["Bob"], rerun_output(program, ["Bob"]))
+
+
+def test_truncated_run_output_not_reused():
+    list(load_chapters())
+    step = pages["InteractiveProgramsWithInput"].get_step("convert_input_to_int")
+    submission, _ = run_entry(step, 'print("x" * 200_000)\nname = input()', ["Bob"])
+    assert submission.run_output is None
+
+
+def test_reuse_run_output():
+    list(load_chapters())
+    step = pages["InteractiveProgramsWithInput"].get_step("convert_input_to_int")
+    program = step.program
+    assert "input()" in program
+
+    # The run used the step's stdin_input, so it's the test for the user's own values
+    _, reused = run_entry(step, program, ["7"])
+    # A different input means the code has to run again for that test
+    _, not_reused = run_entry(step, program, ["8"])
+    assert reused["passed"] and not_reused["passed"]
+    assert (
+        reused["timings"]["counters"]["tests_run"] + 1
+        == not_reused["timings"]["counters"]["tests_run"]
+    )
+
+
+class verbatim_step(VerbatimStep):
+    program = 'x = True\nprint("a b")'
+
+
+def check_verbatim(input_program, monkeypatch):
+    """
+    Returns the result of checking verbatim_step and whether the trees were compared in detail.
+    """
+    verbatim_step.parsed_program.cache_clear()
+    detailed = []
+    original = VerbatimStep.are_trees_equal
+    monkeypatch.setattr(
+        VerbatimStep,
+        "are_trees_equal",
+        lambda self, *args: detailed.append(args) or original(self, *args),
+    )
+    step = verbatim_step(input_program, "", "editor", None)
+    return step.check(), bool(detailed)
+
+
+def test_verbatim_dump_fast_path(monkeypatch):
+    # Equal dumps skip the detailed comparison
+    assert check_verbatim(verbatim_step.program, monkeypatch) == (True, False)
+    assert check_verbatim(verbatim_step.program + "\nprint(x)", monkeypatch) == (True, False)
+
+    # Different dumps still get the detailed comparison and its messages
+    assert check_verbatim('x = True\nprint("ab")', monkeypatch) == (
+        dict(message=t.Terms.string_spaces_differ), True
+    )
+    assert check_verbatim('x = False\nprint("a b")', monkeypatch)[0] is None
+    assert check_verbatim('X = True\nprint("a b")', monkeypatch) == (
+        dict(message=t.Terms.case_sensitive), True
+    )
+
+
+def test_runner_compiles_submission():
+    program = "import sys\ncode = sys._getframe().f_code"
+    runner = FullRunner(filename="/my_program.py")
+    parts = []
+    runner.set_callback(lambda event_type, data: parts.extend(data.get("parts", [])))
+
+    runner.submission = submission = Submission(program, runner.filename)
+    runner.run(program)
+    # The runner ran the code object compiled from the submission's tree
+    assert runner.console.locals["code"] is submission.compile("exec")
+
+    # SubmissionRunner.pre_run copies Runner.pre_run, so they should give the same results
+    for program, mode in [
+        ("1 +", "exec"),
+        ("# comment", "single"),
+        ("for i in range(2): print(i)", "single"),
+        ("1 + 2", "eval"),
+        ("print(1)", "exec"),
+    ]:
+        results = []
+        for submission in [None, Submission(program, runner.filename)]:
+            parts.clear()
+            runner.submission = submission
+            runner.run(program, mode)
+            results.append([(part["type"], part.get("text")) for part in parts])
+        assert results[0] == results[1]
+
+
+def test_syntax_error_text(tmp_path):
+    # The runner hasn't written this submission to the file yet
+    path = tmp_path / "my_program.py"
+    path.write_text("for i in range(3):\n    left += 1\n")
+    submission = Submission("pass\n3 x 4", str(path))
+    with pytest.raises(SyntaxError) as error:
+        submission.tree  # noqa
+    assert error.value.text == "3 x 4"
@@ -0,0 +1,69 @@
+import time
+
+import core.text
+from core.checker import check_entry, FullRunner
+from core.runner import timings
+from core.runner.utils import highlight_python
+from core.text import ExerciseStep, load_chapters, step_test_entries
+
+
+def test_timings(monkeypatch):
+    list(load_chapters())
+    entry = next(
+        entry
+        for _, step, substep, entry in step_test_entries()
+        if substep is step and issubclass(step, ExerciseStep)
+    )
+    sink = timings.HistogramSink()
+    monkeypatch.setattr(timings, "sinks", [sink])
+    runner = FullRunner(filename="/my_program.py")
+
+    result = check_entry(entry, lambda *_: None, runner)
+    assert "timings" not in result
+    assert sink.recordings == 0
+
+    result = check_entry(dict(entry, timings=True), lambda *_: None, runner)
+    assert result["passed"]
+    spans = result["timings"]["spans"]
+    assert {"load_step", "run", "check", "tests"} <= set(spans)
+    assert spans["tests"] <= spans["check"]
+    assert result["timings"]["counters"]["tests_checked"] > 0
+
+    result = check_entry(dict(entry, input="1 / 0", timings=True), lambda *_: None, runner)
+    assert "traceback" in result["timings"]["spans"]
+    assert sink.recordings == 2
+    assert sum(sink.histograms["run"]) == 2
+
+    # Variables in tracebacks are highlighted, the second time from the cache
+    highlight_python.cache_clear()
+    for _ in range(2):
+        result = check_entry(dict(entry, input="x = 1\nprint(x + 'a')", timings=True), lambda *_: None, runner)
+    counters = result["timings"]["counters"]
+    assert counters["highlight_cache_hits"] > 0
+    assert counters["highlight_cache_misses"] == 0
+    assert sink.counters["highlight_cache_misses"] > 0
+
+
+def test_lint_span(monkeypatch):
+    list(load_chapters())
+    entry = next(
+        entry
+        for _, step, substep, entry in step_test_entries()
+        if substep is step and issubclass(step, ExerciseStep)
+    )
+
+    def slow_lint(_tree):
+        # lint is a generator, so the work happens while iterating.
+        # time.sleep is replaced by the runner.
+        end = time.perf_counter() + 0.05
+        while time.perf_counter() < end:
+            pass
+        yield "lint message"
+
+    monkeypatch.setattr(core.text, "lint", slow_lint)
+    entry = dict(entry, input="x = 1", source="editor", timings=True)
+    result = check_entry(entry, lambda *_: None, FullRunner(filename="/my_program.py"))
+    assert not result["passed"]
+    [lint_section] = [section for section in result["message_sections"] if section["type"] == "lint"]
+    assert len(lint_section["messages"]) == 1
+    assert result["timings"]["spans"]["lint"] >= 0.05
@@ -0,0 +1,158 @@
+import uuid
+from itertools import count
+
+from core.checker import FullRunner, explain_traceback
+from core.runner import explanations
+from core.runner.stack_data import (
+    TracebackBudget,
+    format_traceback_stack_data,
+    serialize_traceback,
+    serializer,
+)
+
+programs = [
+    "x = 1\nprint(x + 'a')",
+    """
+def f(n):
+    x = [n] * 10
+    return f(n + 1)
+
+f(0)
+""",
+    """
+def f(n):
+    return g(n + 1)
+
+def g(n):
+    if n % 3:
+        return f(n + 1)
+    return h(n)
+
+def h(n):
+    return f(n)
+
+f(0)
+""",
+    """
+class A:
+    def method(self):
+        a = self
+        b = 2
+        return int('x')
+
+try:
+    A().method()
+except ValueError as e:
+    raise TypeError('wrapped') from e
+""",
+    """
+try:
+    {}['missing']
+except KeyError:
+    lst = [1, 2, 3]
+    if True:
+        if True:
+            lst[10]
+""",
+    """
+import random
+random.choice([])
+""",
+]
+
+
+def serialize_both(program):
+    runner = FullRunner(filename="/my_program.py")
+    runner.set_callback(lambda *_: None)
+    results = []
+
+    def serialize(e):
+        serializer.filename = runner.filename
+        results.append((
+            serialize_traceback(e, runner.filename),
+            dict(text=format_traceback_stack_data(e), data=serializer.format_exception(e)),
+        ))
+        return results[-1][0]
+
+    runner.serialize_traceback = serialize
+    runner.run(program)
+    [result] = results
+    return result
+
+
+def test_serialize_traceback_matches_separate_formatters():
+    # Also fails if stack_data or traceback change the frame collapsing or chained exception
+    # messages that serialize_traceback imitates, since the separate formatters use theirs.
+    for program in programs:
+        new, old = serialize_both(program)
+        for result in [new, old]:
+            for traceback in result["data"]:
+                assert isinstance(traceback.pop("explanation"), str)
+        assert new == old
+
+
+def test_explain_traceback():
+    new, _ = serialize_both("sunshine")
+    [traceback] = new["data"]
+    assert "didyoumean" not in traceback
+    explanation = explain_traceback(traceback["explanation"])
+    assert "no object with the name <code>sunshine</code>" in explanation["friendly"]
+    assert explanation["didyoumean"] == []
+    assert explain_traceback(traceback["explanation"]) == dict(didyoumean=[], friendly="")
+
+
+def test_explain_traceback_from_other_process(monkeypatch):
+    new, _ = serialize_both("sunshine")
+    [traceback] = new["data"]
+    handle = traceback["explanation"]
+    _, _, number = handle.partition("-")
+
+    # A restarted worker has a new process ID and starts numbering handles again
+    monkeypatch.setattr(explanations, "_process_id", uuid.uuid4().hex)
+    monkeypatch.setattr(explanations, "_handle_numbers", count(int(number)))
+    new, _ = serialize_both("sunshine")
+    [traceback] = new["data"]
+    assert traceback["explanation"] != handle
+    assert explain_traceback(handle) == dict(didyoumean=[], friendly="")
+    assert explain_traceback(traceback["explanation"])["friendly"]
+
+
+def test_serialize_traceback_budget():
+    runner = FullRunner(filename="/my_program.py")
+    runner.set_callback(lambda *_: None)
+    budget = TracebackBudget(max_frames=2, max_variables=1)
+    results = []
+    runner.serialize_traceback = lambda e: results.append(serialize_traceback(e, runner.filename, budget)) or results[-1]
+    runner.run(programs[2])
+    [result] = results
+    [data] = result["data"]
+    assert len(data["frames"]) <= 2 + 1
+    assert all(len(frame["variables"]) <= 1 for frame in data["frames"] if frame["type"] == "frame")
+    [omitted] = [frame for frame in data["frames"] if frame["type"] == "omitted_frames"]
+    assert omitted["count"] > 100
+    assert result["text"].count(f"[... {omitted['count']} frames omitted ...]") == 1
+    assert "skipping similar frames" not in result["text"]
+
+
+def test_serialize_traceback_budget_distinct_frames():
+    # Distinct frames beyond the budget aren't described as similar frames
+    runner = FullRunner(filename="/my_program.py")
+    runner.set_callback(lambda *_: None)
+    budget = TracebackBudget(max_frames=2)
+    results = []
+    runner.serialize_traceback = lambda e: results.append(serialize_traceback(e, runner.filename, budget)) or results[-1]
+    runner.run("""
+def a(): return b()
+def b(): return c()
+def c(): return d()
+def d(): return 1 / 0
+
+a()
+""")
+    [result] = results
+    [data] = result["data"]
+    assert [frame["type"] for frame in data["frames"]] == ["frame", "omitted_frames", "frame"]
+    assert data["frames"][1]["count"] == 3
+    assert [frame.get("name") for frame in data["frames"]] == ["<module>", None, "d"]
+    assert "[... 3 frames omitted ...]" in result["text"]
+    assert "skipping similar frames" not in result["text"]